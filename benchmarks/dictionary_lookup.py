@@ -0,0 +1,141 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Benchmark translation with the dictionaries shipped in plover/assets.
+
+All the asset dictionaries are loaded into one StenoDictionaryCollection and a
+random stream of strokes drawn from their entries, with some misstrokes mixed
+in, is translated. The per-stroke time is reported for the current lookup path,
+for the old one that went through MutableMapping.get, for the collection's
+merged index and for its Bloom filter.
+
+Run from the top of the source tree:
+
+    python benchmarks/dictionary_lookup.py
+
+"""
+
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from plover.dictionary.json_dict import load_dictionary
+from plover.steno import Stroke, STENO_KEY_NUMBERS
+from plover.steno_dictionary import StenoDictionaryCollection
+from plover.translation import Translator
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), '..', 'plover', 'assets')
+NUMBERS = dict((v.strip('-'), k) for k, v in STENO_KEY_NUMBERS.items())
+STROKE_COUNT = 50000
+MISSTROKE_RATE = 0.1
+
+
+def parse_stroke(rtfcre):
+    """Convert an RTFCRE stroke to a Stroke or None if it isn't valid."""
+    keys = []
+    right = False
+    for c in rtfcre:
+        if c == '-':
+            right = True
+        elif c == '#':
+            keys.append('#')
+        elif c in NUMBERS:
+            key = NUMBERS[c]
+            keys.extend(('#', key))
+            right = right or key[0] == '-' or key in ('A-', 'O-')
+        elif c == '*':
+            keys.append(c)
+            right = True
+        elif c in 'AO':
+            keys.append(c + '-')
+            right = True
+        elif c in 'EU' or right:
+            keys.append('-' + c)
+            right = True
+        else:
+            keys.append(c + '-')
+    stroke = Stroke(keys)
+    if stroke.rtfcre != rtfcre:
+        return None
+    return stroke
+
+
+def load_dictionaries():
+    dicts = []
+    for filename in sorted(glob.glob(os.path.join(ASSETS_DIR, '*.json'))):
+        with open(filename, 'rb') as f:
+            dicts.append(load_dictionary(f.read()))
+    return dicts
+
+
+def make_strokes(dicts, count):
+    rng = random.Random(0)
+    keys = [k for d in dicts for k in d.iterkeys()]
+    valid = [s for s in (parse_stroke(x) for x in set(sum(keys, ()))) if s]
+    strokes = []
+    while len(strokes) < count:
+        if rng.random() < MISSTROKE_RATE:
+            strokes.append(rng.choice(valid))
+            continue
+        outline = [parse_stroke(x) for x in rng.choice(keys)]
+        if all(outline):
+            strokes.extend(outline)
+    return strokes[:count]
+
+
+class LegacyCollection(StenoDictionaryCollection):
+    """The lookup path before StenoDictionary.lookup existed."""
+
+    def lookup(self, key):
+        for d in self.dicts:
+            value = d.get(key, None)
+            if value:
+                for f in self.filters:
+                    if f(key, value):
+                        return None
+                return value
+
+
+def merged_collection():
+    dc = StenoDictionaryCollection()
+    dc.enable_merged_index(True)
+    return dc
+
+
+def bloom_collection():
+    dc = StenoDictionaryCollection()
+    dc.enable_bloom_filter(True)
+    return dc
+
+
+def time_translation(make_collection, dicts, strokes):
+    dc = make_collection()
+    dc.set_dicts(dicts)
+    translator = Translator()
+    translator.set_dictionary(dc)
+    translator.set_min_undo_length(10)
+    start = time.time()
+    for stroke in strokes:
+        translator.translate(stroke)
+    return (time.time() - start) / len(strokes)
+
+
+def main():
+    dicts = load_dictionaries()
+    strokes = make_strokes(dicts, STROKE_COUNT)
+    print '%d dictionaries, %d entries, %d strokes' % (
+        len(dicts), sum(len(d) for d in dicts), len(strokes))
+    for name, make_collection in (('legacy', LegacyCollection), 
+                                  ('current', StenoDictionaryCollection),
+                                  ('merged', merged_collection),
+                                  ('bloom', bloom_collection)):
+        per_stroke = time_translation(make_collection, dicts, strokes)
+        print '%-8s %8.2f us/stroke' % (name, per_stroke * 1e6)
+
+
+if __name__ == '__main__':
+    main()
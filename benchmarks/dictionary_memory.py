@@ -0,0 +1,80 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Benchmark the memory used by loaded dictionaries.
+
+The dictionaries shipped in plover/assets are loaded, as plain and as compact
+dictionaries, into a StenoDictionaryCollection with the merged index enabled,
+as the engine does. Each run is in its own process and the growth in resident
+memory is reported in total and per entry. Loading the assets several times
+stands in for a user with several overlapping dictionaries.
+
+Run from the top of the source tree:
+
+    python benchmarks/dictionary_memory.py [copies]
+
+"""
+
+import gc
+import glob
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from plover.dictionary.json_dict import load_dictionary
+from plover.steno_dictionary import (StenoDictionaryCollection,
+                                     CompactStenoDictionary)
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), '..', 'plover', 'assets')
+
+
+def resident_memory():
+    """The resident memory of this process in bytes."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure(compact, copies):
+    """Load the assets and print the entry count and memory used."""
+    data = []
+    for filename in sorted(glob.glob(os.path.join(ASSETS_DIR, '*.json'))):
+        with open(filename, 'rb') as f:
+            data.append(f.read())
+    gc.collect()
+    before = resident_memory()
+    dicts = []
+    for i in xrange(copies):
+        for s in data:
+            if compact:
+                d = load_dictionary(s, CompactStenoDictionary())
+            else:
+                d = load_dictionary(s)
+            dicts.append(d)
+            gc.collect()
+    collection = StenoDictionaryCollection()
+    collection.enable_merged_index(True)
+    collection.set_dicts(dicts)
+    gc.collect()
+    print sum(len(d) for d in dicts), resident_memory() - before
+
+
+def main():
+    if len(sys.argv) == 3:
+        measure(sys.argv[1] == 'compact', int(sys.argv[2]))
+        return
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    results = {}
+    for mode in ('plain', 'compact'):
+        output = subprocess.check_output(
+            [sys.executable, __file__, mode, str(copies)])
+        entries, used = map(int, output.split())
+        results[mode] = used
+        print '%-8s %d entries, %.1f MB, %d bytes per entry' % (
+            mode, entries, used / 1e6, used / entries)
+    print 'reduction: %.2fx' % (float(results['plain']) / results['compact'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Benchmark how the translator builds candidate keys for a stroke.
+
+For each stroke, the translator tries every run of earlier translations that
+ends with it, up to the dictionary's longest key. The per-stroke time is
+reported for the current code, which slices one RTFCRE tuple, and for the old
+code, which built a stroke list and a key for every candidate, at a few
+longest key lengths.
+
+The dictionary is synthetic: a word for each of a handful of strokes and some
+longer entries made of the same strokes, so the undo window is always full.
+
+Run from the top of the source tree:
+
+    python benchmarks/translation_candidates.py
+
+"""
+
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from plover import translation
+from plover.steno import Stroke
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.translation import Translation, Translator, SUFFIX_KEYS
+
+STROKES = [Stroke([k]) for k in ('S-', 'T-', 'K-', 'P-', 'W-', 'H-', 'R-',
+                                 '-F', '-R', '-P', '-B', '-L')]
+LONG_ENTRY_COUNT = 5000
+STROKE_COUNT = 20000
+LONGEST_KEYS = (5, 10, 20)
+
+
+def legacy_find_translation(translations, dictionary, stroke):
+    t = legacy_find_translation_helper(translations, dictionary, stroke, [])
+    if t:
+        return t
+    mapping = legacy_lookup([stroke], dictionary, [])
+    if mapping is not None:
+        return Translation([stroke], mapping)
+    t = legacy_find_translation_helper(translations, dictionary, stroke,
+                                       SUFFIX_KEYS)
+    if t:
+        return t
+    return Translation([stroke], legacy_lookup([stroke], dictionary,
+                                               SUFFIX_KEYS))
+
+
+def legacy_find_translation_helper(translations, dictionary, stroke, suffixes):
+    for i in xrange(len(translations)):
+        replaced = translations[i:]
+        strokes = list(itertools.chain(*[t.strokes for t in replaced]))
+        if not dictionary.has_prefix(tuple(s.rtfcre for s in strokes)):
+            continue
+        strokes.append(stroke)
+        mapping = legacy_lookup(strokes, dictionary, suffixes)
+        if mapping != None:
+            t = Translation(strokes, mapping)
+            t.replaced = replaced
+            return t
+
+
+def legacy_lookup(strokes, dictionary, suffixes):
+    dict_key = tuple(s.rtfcre for s in strokes)
+    result = dictionary.lookup(dict_key)
+    if result != None:
+        return result
+    for key in suffixes:
+        if key in strokes[-1].steno_keys:
+            dict_key = (Stroke([key]).rtfcre,)
+            suffix_mapping = dictionary.lookup(dict_key)
+            if suffix_mapping == None: continue
+            keys = list(strokes[-1].steno_keys)
+            keys.remove(key)
+            copy = strokes[:]
+            copy[-1] = Stroke(keys)
+            dict_key = tuple(s.rtfcre for s in copy)
+            main_mapping = dictionary.lookup(dict_key)
+            if main_mapping == None: continue
+            return main_mapping + ' ' + suffix_mapping
+    return None
+
+
+def make_dictionary(longest_key, rng):
+    d = StenoDictionary()
+    for s in STROKES:
+        d[(s.rtfcre,)] = s.rtfcre.lower()
+    for i in xrange(LONG_ENTRY_COUNT):
+        length = rng.randint(2, longest_key)
+        key = tuple(rng.choice(STROKES).rtfcre for _ in xrange(length))
+        d[key] = 'entry%d' % i
+    key = tuple(STROKES[0].rtfcre for _ in xrange(longest_key))
+    d[key] = 'longest'
+    dc = StenoDictionaryCollection()
+    dc.set_dicts([d])
+    return dc
+
+
+def time_translation(find_translation, dictionary, strokes):
+    saved = translation._find_translation
+    translation._find_translation = find_translation
+    try:
+        translator = Translator()
+        translator.set_dictionary(dictionary)
+        start = time.time()
+        for stroke in strokes:
+            translator.translate(stroke)
+        return (time.time() - start) / len(strokes)
+    finally:
+        translation._find_translation = saved
+
+
+def main():
+    rng = random.Random(0)
+    strokes = [rng.choice(STROKES) for _ in xrange(STROKE_COUNT)]
+    print '%d strokes' % len(strokes)
+    for longest_key in LONGEST_KEYS:
+        dictionary = make_dictionary(longest_key, rng)
+        old = time_translation(legacy_find_translation, dictionary, strokes)
+        new = time_translation(translation._find_translation, dictionary,
+                               strokes)
+        print 'longest key %2d: old %7.2f us/stroke, new %7.2f us/stroke' % (
+            longest_key, old * 1e6, new * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@ interface.
 """
 
 
+import os
+
 # Import plover modules.
 import plover.config as conf
 import plover.formatting as formatting
@@ -26,13 +28,14 @@ import plover.machine.sidewinder
 import plover.steno_dictionary as steno_dictionary
 import plover.steno as steno
 import plover.translation as translation
-from plover.dictionary.base import load_dictionary
+from plover.dictionary.base import load_dictionary, load_overlay
 from plover.exception import InvalidConfigurationError,DictionaryLoaderException
 import plover.dictionary.json_dict as json_dict
 import plover.dictionary.rtfcre_dict as rtfcre_dict
 from plover.machine.registry import machine_registry, NoSuchMachineException
 from plover.logger import Logger
 from plover.dictionary.loading_manager import manager as dict_manager
+from plover.dictionary.watcher import DictionaryWatcher
 
 # Because 2.7 doesn't have this yet.
 class SimpleNamespace(object):
@@ -48,12 +51,7 @@ def init_engine(engine, config):
     """Initialize a StenoEngine from a config object."""
     reset_machine(engine, config)
     
-    dictionary_file_names = config.get_dictionary_file_names()
-    try:
-        dicts = dict_manager.load(dictionary_file_names)
-    except DictionaryLoaderException as e:
-        raise InvalidConfigurationError(unicode(e))
-    engine.get_dictionary().set_dicts(dicts)
+    load_dictionaries(engine, config)
 
     log_file_name = config.get_log_file_name()
     if log_file_name:
@@ -64,6 +62,106 @@ def init_engine(engine, config):
     
     engine.set_is_running(config.get_auto_start())
 
+def load_dictionaries(engine, config):
+    """Load the dictionaries in config and give them to the engine.
+
+    Normally this waits for all the dictionaries to load. In progressive mode
+    it returns right away and the engine gets each dictionary as soon as it is
+    loaded, in the configured order of precedence. Strokes translated in the
+    meantime are translated again as dictionaries arrive. A dictionary that
+    fails to load is left out and the error goes to the engine's error
+    listeners.
+
+    Unless the dictionaries are compact, the index for reverse lookups is then
+    built in the background so the first reverse lookup doesn't have to wait.
+
+    If an overlay file is configured, the overlay is loaded first and new
+    entries go to it.
+    """
+    set_overlay(engine, config)
+    dict_manager.set_process_count(config.get_dictionary_load_processes())
+    dict_manager.set_compact(config.get_compact_dictionaries())
+    filenames = config.get_dictionary_file_names()
+    reload_dictionaries = config.get_reload_dictionaries()
+    build_index = not config.get_compact_dictionaries()
+    # Identifies this load so results of an older one can be ignored.
+    engine.loading_dictionaries = filenames
+    if config.get_progressive_loading():
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                raise InvalidConfigurationError(
+                    u'Dictionary file not found: %s' % filename)
+        def loaded(pairs, exception, remaining):
+            engine.thread_hook(_dictionaries_loaded, engine, filenames, pairs, 
+                               exception, remaining, reload_dictionaries, 
+                               build_index)
+        dict_manager.load_progressively(filenames, loaded)
+        return
+    try:
+        dicts = dict_manager.load(filenames)
+    except DictionaryLoaderException as e:
+        raise InvalidConfigurationError(unicode(e))
+    engine.get_dictionary().set_dicts(dicts)
+    pairs = zip(filenames, dicts) if reload_dictionaries else []
+    engine.dictionary_watcher.set_dictionaries(pairs)
+    if build_index:
+        engine.get_dictionary().build_translation_index(background=True)
+
+def set_overlay(engine, config):
+    """Load the overlay in config, if there is one, and give it to the engine.
+
+    The overlay is compact if the dictionaries are, so the merged index can
+    stay packed. An overlay that is already loaded from the same file in the
+    same mode is kept. Otherwise its unsaved edits are written before the new
+    one is loaded.
+    """
+    dictionary = engine.get_dictionary()
+    filename = config.get_dictionary_overlay_file()
+    compact = config.get_compact_dictionaries()
+    overlay = dictionary.overlay
+    if overlay is None:
+        if not filename:
+            return
+    elif (overlay.save.filename == filename and 
+          isinstance(overlay, steno_dictionary.CompactStenoDictionary) == 
+          compact):
+        return
+    if overlay is not None:
+        overlay.save.flush()
+    overlay = None
+    if filename:
+        try:
+            overlay = load_overlay(filename, compact)
+        except DictionaryLoaderException as e:
+            raise InvalidConfigurationError(unicode(e))
+    dictionary.set_overlay(overlay)
+
+def _dictionaries_loaded(engine, filenames, pairs, exception, remaining, 
+                         reload_dictionaries, build_index):
+    if engine.loading_dictionaries is not filenames:
+        return
+    if exception:
+        # There is no one to raise this to any more so the error listeners get
+        # it instead. The dictionary is left out.
+        engine.report_error(InvalidConfigurationError(unicode(exception)))
+    engine.get_dictionary().set_dicts([d for f, d in pairs])
+    engine.translator.retranslate()
+    if not remaining and reload_dictionaries:
+        engine.dictionary_watcher.set_dictionaries(pairs)
+    if not remaining and build_index:
+        engine.get_dictionary().build_translation_index(background=True)
+
+def watch_dictionaries(engine, config):
+    """Set which dictionaries are reloaded when their files change."""
+    pairs = []
+    if config.get_reload_dictionaries():
+        filenames = config.get_dictionary_file_names()
+        try:
+            pairs = zip(filenames, dict_manager.load(filenames))
+        except DictionaryLoaderException as e:
+            raise InvalidConfigurationError(unicode(e))
+    engine.dictionary_watcher.set_dictionaries(pairs)
+
 def reset_machine(engine, config):
     """Set the machine on the engine based on config."""
     machine_type = config.get_machine_type()
@@ -90,13 +188,13 @@ def update_engine(engine, old, new):
             raise InvalidConfigurationError(unicode(e))
         engine.set_machine(machine_class(machine_options))
 
-    dictionary_file_names = new.get_dictionary_file_names()
-    if old.get_dictionary_file_names() != dictionary_file_names:
-        try:
-            dicts = dict_manager.load(dictionary_file_names)
-        except DictionaryLoaderException as e:
-            raise InvalidConfigurationError(unicode(e))
-        engine.get_dictionary().set_dicts(dicts)
+    if (old.get_dictionary_file_names() != new.get_dictionary_file_names() or
+        old.get_compact_dictionaries() != new.get_compact_dictionaries() or
+        old.get_dictionary_overlay_file() != 
+        new.get_dictionary_overlay_file()):
+        load_dictionaries(engine, new)
+    elif old.get_reload_dictionaries() != new.get_reload_dictionaries():
+        watch_dictionaries(engine, new)
 
     log_file_name = new.get_log_file_name()
     if old.get_log_file_name() != log_file_name:
@@ -148,13 +246,17 @@ class StenoEngine(object):
         """Creates and configures a single steno pipeline."""
         self.subscribers = []
         self.stroke_listeners = []
+        self.error_listeners = []
         self.is_running = False
         self.machine = None
         self.thread_hook = thread_hook
 
         self.translator = translation.Translator()
+        self.translator.get_dictionary().enable_merged_index(True)
         self.formatter = formatting.Formatter()
         self.logger = Logger()
+        self.dictionary_watcher = DictionaryWatcher(thread_hook)
+        self.loading_dictionaries = None
         self.translator.add_listener(self.logger.log_translation)
         self.translator.add_listener(self.formatter.format)
         # This seems like a reasonable number. If this becomes a problem it can
@@ -215,12 +317,19 @@ class StenoEngine(object):
         Calling this method causes all worker threads involved to terminate.
         This method should be called at least once if the start method had been
         previously called. Calling this method more than once or before the
-        start method has been called has no effect.
+        start method has been called has no effect. Dictionary edits that 
+        haven't been saved yet are written before this returns. If some can't
+        be written the error goes to the error listeners.
 
         """
         if self.machine:
             self.machine.stop_capture()
         self.is_running = False
+        self.dictionary_watcher.stop()
+        try:
+            self.get_dictionary().flush()
+        except Exception as e:
+            self.report_error(e)
 
     def add_callback(self, callback):
         """Subscribes a function to receive changes of the is_running state.
@@ -250,6 +359,23 @@ class StenoEngine(object):
     def remove_stroke_listener(self, listener):
         self.stroke_listeners.remove(listener)
 
+    def add_error_listener(self, listener):
+        """Call listener with errors that can't be raised to the caller.
+
+        These come from work done in the background, like loading dictionaries
+        progressively. Errors are also logged.
+
+        """
+        self.error_listeners.append(listener)
+
+    def remove_error_listener(self, listener):
+        self.error_listeners.remove(listener)
+
+    def report_error(self, error):
+        self.logger.log_error(unicode(error))
+        for listener in self.error_listeners:
+            listener(error)
+
     def _translate_stroke(self, s):
         stroke = steno.Stroke(s)
         self.translator.translate(stroke)
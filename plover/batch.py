@@ -0,0 +1,369 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Translating a whole stream of strokes at once.
+
+This is for running a stroke log, or any other record of strokes, through a
+set of dictionaries without a machine or an engine: the strokes are
+translated as a Translator would translate them and the final translations are
+formatted into text in one pass. Nothing is sent to the screen.
+
+It can also be run from the top of the source tree:
+
+    python -m plover.batch [-j PROCESSES] LOG_FILE DICTIONARY...
+
+where the dictionaries are in order of precedence, highest last, as in the
+configuration. The text is written to standard output and the throughput to
+standard error.
+
+A long stream can be translated in several processes. The greedy translation
+can only take in as many strokes as the longest key, so the strokes can be
+cut wherever no dictionary key spans the cut, and the pieces translated
+separately. Each worker starts a little before its piece so that its history
+and formatting have caught up by the start of it; where they don't match the
+end of the piece before, which can happen after a run of corrections, the
+piece is translated again from the real history. Either way the text is the
+same as translating in one go. The workers get the dictionaries by forking,
+so where there is no fork the strokes are translated in one process.
+
+"""
+
+from collections import namedtuple
+from itertools import izip
+import logging
+import multiprocessing
+import re
+import sys
+import time
+
+from plover.dictionary.base import load_dictionary
+from plover.formatting import apply_formatting, OutputHelper
+from plover.logger import LOGGER_NAME
+from plover.steno import Stroke
+from plover.steno_dictionary import StenoDictionaryCollection
+from plover.translation import (SUFFIX_KEYS, TranslationStream,
+                                translate_strokes)
+
+# Matches the strokes written by the Logger.
+STROKE_LOG_RE = re.compile(r'Stroke\((.*)\)\s*$')
+
+# Translations are rendered this many at a time so the text the formatter
+# works on stays short.
+RENDER_CHUNK_SIZE = 1000
+
+# The undo length the engine uses.
+DEFAULT_UNDO_LENGTH = 10
+
+# With several processes, the strokes are split in chunks of at least this
+# many, four for each process if there are enough strokes.
+PARALLEL_CHUNK_SIZE = 2000
+
+# How far back from a cut a worker looks for a safe cut to start from.
+WARMUP_SEARCH = 1000
+
+# Whether worker processes are forked. Elsewhere they would have to be sent
+# the dictionaries, which can't be pickled.
+CAN_FORK = sys.platform != 'win32'
+
+
+class BatchResult(namedtuple('BatchResult', ['translations', 'text',
+                                             'stroke_count', 'seconds'])):
+    """The outcome of translate_batch.
+
+    translations -- The final translations, in order.
+
+    text -- The text they format to.
+
+    stroke_count -- The number of strokes translated.
+
+    seconds -- How long translating and formatting took.
+
+    """
+
+    @property
+    def strokes_per_second(self):
+        if not self.seconds:
+            return float('inf')
+        return self.stroke_count / self.seconds
+
+
+def read_stroke_log(fp):
+    """Yield the strokes in a stroke log written by the Logger."""
+    for line in fp:
+        m = STROKE_LOG_RE.search(line)
+        if m:
+            yield Stroke(m.group(1).split())
+
+
+class _TextOutput(object):
+    """An output for the Formatter that collects the text it types."""
+
+    def __init__(self):
+        self.parts = []
+
+    def send_string(self, s):
+        self.parts.append(s)
+
+    def send_backspaces(self, n):
+        parts = self.parts
+        while n and parts:
+            last = parts.pop()
+            if len(last) > n:
+                parts.append(last[:-n])
+                break
+            n -= len(last)
+
+    def send_key_combination(self, c):
+        pass
+
+    def send_engine_command(self, c):
+        pass
+
+    def text(self):
+        return u''.join(self.parts)
+
+
+def render_text(translations):
+    """The text formatted translations type.
+
+    Key combinations and commands are left out.
+
+    """
+    output = _TextOutput()
+    for i in xrange(0, len(translations), RENDER_CHUNK_SIZE):
+        chunk = translations[i:i + RENDER_CHUNK_SIZE]
+        OutputHelper(output).render([], [a for t in chunk for a in t.formatting])
+    return output.text()
+
+
+class _CountingIterator(object):
+    """Passes on the items of an iterable and counts them."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        item = next(self._iterator)
+        self.count += 1
+        return item
+
+
+def translate_batch(strokes, dictionary, undo_length=DEFAULT_UNDO_LENGTH,
+                    processes=1):
+    """Translate and format strokes with dictionary.
+
+    Arguments:
+
+    strokes -- An iterable of Stroke objects, or a stroke log file.
+
+    dictionary -- A StenoDictionaryCollection.
+
+    undo_length -- The minimum number of strokes that can be undone, as set on
+    the Translator. This only matters to how far back corrections can go.
+
+    processes -- The number of processes to translate in. With more than one,
+    the strokes are split at safe cuts and the pieces are translated in a pool
+    of worker processes, which inherit the dictionary by forking. The result is
+    the same. Where processes can't be forked a warning is logged and the
+    strokes are translated in this process.
+
+    Returns a BatchResult.
+
+    """
+    if hasattr(strokes, 'readline'):
+        strokes = read_stroke_log(strokes)
+    if processes > 1 and not CAN_FORK:
+        logging.getLogger(LOGGER_NAME).warning(
+            'Translating in one process since processes cannot be forked here.')
+        processes = 1
+    start = time.time()
+    if processes > 1:
+        strokes = list(strokes)
+        stroke_count = len(strokes)
+        translations = _translate_parallel(strokes, dictionary, undo_length,
+                                           processes)
+    else:
+        counted = _CountingIterator(strokes)
+        translations = translate_strokes(counted, dictionary, undo_length, 
+                                         apply_formatting)
+        stroke_count = counted.count
+    text = render_text(translations)
+    return BatchResult(translations, text, stroke_count, time.time() - start)
+
+
+def is_safe_cut(strokes, i, dictionary):
+    """Whether no dictionary entry can span the cut before strokes[i].
+
+    A translation can only take in strokes from before a safe cut if they
+    start a dictionary key that goes on past it, with or without a suffix key
+    folded off the last stroke.
+
+    """
+    if i <= 0 or i >= len(strokes):
+        return True
+    stroke = strokes[i]
+    last_strokes = [stroke.rtfcre]
+    for key in SUFFIX_KEYS:
+        if key in stroke.steno_keys:
+            keys = list(stroke.steno_keys)
+            keys.remove(key)
+            last_strokes.append(Stroke(keys).rtfcre)
+    has_prefix = dictionary.has_prefix
+    key = ()
+    for j in xrange(i - 1, max(i - dictionary.longest_key, -1), -1):
+        key = (strokes[j].rtfcre,) + key
+        for last in last_strokes:
+            if has_prefix(key + (last,)):
+                return False
+    return True
+
+
+def _find_safe_cut(strokes, i, dictionary, stop):
+    """The first safe cut from i on towards stop, or None.
+
+    Searches backwards if stop is less than i.
+
+    """
+    step = 1 if stop >= i else -1
+    for j in xrange(i, stop, step):
+        if is_safe_cut(strokes, j, dictionary):
+            return j
+    return None
+
+
+def _history_key(translations, tail):
+    """Something that is equal for histories that translate the same.
+
+    Replaced translations are formatted again when they are restored, so only
+    their strokes and text matter.
+
+    """
+    def key(t):
+        return t.rtfcre, t.english, [key(r) for r in t.replaced]
+    return ([(key(t), t.formatting) for t in translations],
+            tail.formatting if tail is not None else None)
+
+
+def _chunks(strokes, dictionary, size, processes):
+    """Split the strokes at safe cuts.
+
+    Yields the start, the end and where a worker should start translating
+    for each chunk.
+
+    """
+    chunk_size = max(PARALLEL_CHUNK_SIZE, len(strokes) // processes // 4, 1)
+    start = 0
+    while start < len(strokes):
+        end = _find_safe_cut(strokes, start + chunk_size, dictionary,
+                             len(strokes))
+        if end is None:
+            end = len(strokes)
+        # The worker starts far enough back to end up with the same history
+        # at the start of the chunk as translating everything would.
+        warmup = max(start - 2 * size, 0)
+        safe = _find_safe_cut(strokes, warmup, dictionary,
+                              max(warmup - WARMUP_SEARCH, -1))
+        if safe is not None:
+            warmup = safe
+        yield start, end, warmup
+        start = end
+
+
+# Set in the pool's worker processes.
+_worker_job = None
+
+def _init_worker(strokes, dictionary, undo_length):
+    global _worker_job
+    _worker_job = strokes, dictionary, undo_length
+
+
+def _translate_chunk(chunk):
+    """Translate a chunk in a worker process.
+
+    Returns the history the worker had at the start of the chunk, the
+    translations that were finished in the chunk and the history at the end.
+
+    """
+    start, end, warmup = chunk
+    strokes, dictionary, undo_length = _worker_job
+    stream = TranslationStream(dictionary, undo_length, apply_formatting)
+    stream.translate(strokes[warmup:start])
+    stream.trim()
+    before = _stream_history(stream)
+    k = len(stream.done)
+    stream.translate(strokes[start:end])
+    stream.trim()
+    return before, stream.done[k:], _stream_history(stream)
+
+
+def _stream_history(stream):
+    return (stream.state.translations[:],
+            stream.done[-1] if stream.done else None)
+
+
+def _translate_parallel(strokes, dictionary, undo_length, processes):
+    size = max(dictionary.longest_key, undo_length)
+    chunks = list(_chunks(strokes, dictionary, size, processes))
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (strokes, dictionary, undo_length))
+    try:
+        results = pool.imap(_translate_chunk, chunks)
+        translations = []
+        history = [], None
+        for (start, end, warmup), (before, done, after) in izip(chunks,
+                                                                  results):
+            if _history_key(*before) != _history_key(*history):
+                # A correction reached back past where the worker started,
+                # or the formatting hadn't settled. Carry on from the real
+                # history instead.
+                done, after = _continue(strokes[start:end], history,
+                                        dictionary, undo_length)
+            translations.extend(done)
+            history = after
+    finally:
+        pool.terminate()
+    translations.extend(history[0])
+    return translations
+
+
+def _continue(strokes, history, dictionary, undo_length):
+    """Translate strokes from history like _translate_chunk."""
+    translations, tail = history
+    stream = TranslationStream(dictionary, undo_length, apply_formatting)
+    stream.state.translations.extend(translations)
+    if tail is not None:
+        stream.done.append(tail)
+    k = len(stream.done)
+    stream.translate(strokes)
+    stream.trim()
+    return stream.done[k:], _stream_history(stream)
+
+
+def main():
+    args = sys.argv[1:]
+    processes = 1
+    if args[:1] == ['-j'] and len(args) > 1 and args[1].isdigit():
+        processes = int(args[1])
+        args = args[2:]
+    if len(args) < 2:
+        print >>sys.stderr, ('usage: python -m plover.batch [-j PROCESSES] '
+                             'LOG_FILE DICTIONARY...')
+        sys.exit(2)
+    # Warnings go to standard error.
+    logging.basicConfig(format='%(message)s')
+    dictionary = StenoDictionaryCollection()
+    dictionary.enable_merged_index(True)
+    dictionary.set_dicts([load_dictionary(f) for f in args[1:]])
+    with open(args[0], 'rb') as f:
+        result = translate_batch(f, dictionary, processes=processes)
+    sys.stdout.write(result.text.encode('utf-8'))
+    print >>sys.stderr, '%d strokes in %.2fs, %.0f strokes per second' % (
+        result.stroke_count, result.seconds, result.strokes_per_second)
+
+
+if __name__ == '__main__':
+    main()
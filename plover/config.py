@@ -28,6 +28,18 @@ DICTIONARY_CONFIG_SECTION = 'Dictionary Configuration'
 DICTIONARY_FILE_OPTION = 'dictionary_file'
 DEFAULT_DICTIONARY_FILE = os.path.join(CONFIG_DIR, 'dict.json')
 
+DICTIONARY_LOADING_SECTION = 'Dictionary Loading'
+DICTIONARY_LOAD_PROCESSES_OPTION = 'processes'
+DEFAULT_DICTIONARY_LOAD_PROCESSES = 0
+DICTIONARY_RELOAD_OPTION = 'reload_on_change'
+DEFAULT_DICTIONARY_RELOAD = False
+DICTIONARY_PROGRESSIVE_OPTION = 'progressive'
+DEFAULT_DICTIONARY_PROGRESSIVE = False
+DICTIONARY_COMPACT_OPTION = 'compact'
+DEFAULT_DICTIONARY_COMPACT = False
+DICTIONARY_OVERLAY_OPTION = 'overlay_file'
+DEFAULT_DICTIONARY_OVERLAY = ''
+
 LOGGING_CONFIG_SECTION = 'Logging Configuration'
 LOG_FILE_OPTION = 'log_file'
 DEFAULT_LOG_FILE = os.path.join(CONFIG_DIR, 'plover.log')
@@ -171,6 +183,47 @@ class Config(object):
             filenames = [DEFAULT_DICTIONARY_FILE]
         return filenames
 
+    def set_dictionary_load_processes(self, n):
+        self._set(DICTIONARY_LOADING_SECTION, DICTIONARY_LOAD_PROCESSES_OPTION, 
+                  n)
+
+    def get_dictionary_load_processes(self):
+        return self._get_int(DICTIONARY_LOADING_SECTION, 
+                             DICTIONARY_LOAD_PROCESSES_OPTION,
+                             DEFAULT_DICTIONARY_LOAD_PROCESSES)
+
+    def set_reload_dictionaries(self, b):
+        self._set(DICTIONARY_LOADING_SECTION, DICTIONARY_RELOAD_OPTION, b)
+
+    def get_reload_dictionaries(self):
+        return self._get_bool(DICTIONARY_LOADING_SECTION, 
+                              DICTIONARY_RELOAD_OPTION, 
+                              DEFAULT_DICTIONARY_RELOAD)
+
+    def set_progressive_loading(self, b):
+        self._set(DICTIONARY_LOADING_SECTION, DICTIONARY_PROGRESSIVE_OPTION, b)
+
+    def get_progressive_loading(self):
+        return self._get_bool(DICTIONARY_LOADING_SECTION, 
+                              DICTIONARY_PROGRESSIVE_OPTION, 
+                              DEFAULT_DICTIONARY_PROGRESSIVE)
+
+    def set_compact_dictionaries(self, b):
+        self._set(DICTIONARY_LOADING_SECTION, DICTIONARY_COMPACT_OPTION, b)
+
+    def get_compact_dictionaries(self):
+        return self._get_bool(DICTIONARY_LOADING_SECTION, 
+                              DICTIONARY_COMPACT_OPTION, 
+                              DEFAULT_DICTIONARY_COMPACT)
+
+    def set_dictionary_overlay_file(self, filename):
+        self._set(DICTIONARY_LOADING_SECTION, DICTIONARY_OVERLAY_OPTION, 
+                  filename)
+
+    def get_dictionary_overlay_file(self):
+        return self._get(DICTIONARY_LOADING_SECTION, DICTIONARY_OVERLAY_OPTION, 
+                         DEFAULT_DICTIONARY_OVERLAY)
+
     def set_log_file_name(self, filename):
         self._set(LOGGING_CONFIG_SECTION, LOG_FILE_OPTION, filename)
 
@@ -7,42 +7,125 @@
 
 """Common elements to all dictionary formats."""
 
+import logging
+import os
 from os.path import splitext
 import shutil
 import threading
+import time
 
+from plover.dictionary.cache import (load_cache, save_cache, file_digest, 
+                                     DigestReader)
+from plover.dictionary.journal import (append_entries, replay_journal, 
+                                       journal_filename, compacting_filename)
 import plover.dictionary.json_dict as json_dict
 import plover.dictionary.rtfcre_dict as rtfcre_dict
 from plover.config import JSON_EXTENSION, RTF_EXTENSION, CONFIG_DIR
 from plover.exception import DictionaryLoaderException
+from plover.logger import LOGGER_NAME
+from plover.steno_dictionary import StenoDictionary, CompactStenoDictionary
+
+# A journal is compacted into the main file once it is this big...
+MAX_JOURNAL_SIZE = 256 * 1024
+# ...or once its first entry is this many seconds old.
+MAX_JOURNAL_AGE = 60 * 60
+# Edits are saved once there have been none for this many seconds...
+SAVE_DEBOUNCE = 1.0
+# ...or once the oldest unsaved edit is this many seconds old.
+SAVE_MAX_LATENCY = 10.0
 
 dictionaries = {
     JSON_EXTENSION.lower(): json_dict,
     RTF_EXTENSION.lower(): rtfcre_dict,
 }
 
-def load_dictionary(filename):
-    """Load a dictionary from a file."""
+def _get_dictionary_type(filename):
     extension = splitext(filename)[1].lower()
-    
     try:
-        dict_type = dictionaries[extension]
+        return dictionaries[extension]
     except KeyError:
         raise DictionaryLoaderException(
             'Unsupported extension for dictionary: %s. Supported extensions: %s' %
             (extension, ', '.join(dictionaries.keys())))
 
+def load_dictionary(filename, compact=False):
+    """Load a dictionary from a file.
+
+    With compact set the dictionary is a CompactStenoDictionary.
+
+    """
+    d = parse_dictionary(filename, compact)
+    attach_saver(d, filename)
+    return d
+
+def parse_dictionary(filename, compact=False):
+    """Load a dictionary from a file without setting its save function."""
+    dict_type = _get_dictionary_type(filename)
     loader = dict_type.load_dictionary
+    if compact:
+        d = CompactStenoDictionary()
+    else:
+        d = StenoDictionary()
 
     try:
-        with open(filename, 'rb') as f:
-            d = loader(f.read())
+        if load_cache(filename, file_digest(filename), d) is None:
+            # The file is hashed as it is parsed so the cache matches what was
+            # parsed even if the file changes in the meantime.
+            with open(filename, 'rb') as f:
+                reader = DigestReader(f)
+                loader(reader, d)
+            save_cache(filename, reader.digest(), d)
     except IOError as e:
         raise DictionaryLoaderException(unicode(e))
-        
-    d.save = ThreadedSaver(d, filename, dict_type.save_dictionary)
+    replay_journal(d, filename)
+    return d
+
+def load_overlay(filename, compact=False):
+    """Load a dictionary for edits to go to, which may not exist yet.
+
+    With compact set the dictionary is a CompactStenoDictionary.
+
+    """
+    if os.path.exists(filename):
+        return load_dictionary(filename, compact)
+    # Edits may not have been compacted into the file yet.
+    if compact:
+        d = CompactStenoDictionary()
+    else:
+        d = StenoDictionary()
+    replay_journal(d, filename)
+    attach_saver(d, filename)
     return d
 
+def update_dictionary(d, entries):
+    """Change d in place to match entries.
+
+    Only the entries that differ are set or deleted so listeners on d see just
+    the changes. Edits to d that haven't been saved yet are kept.
+
+    Returns the keys that were changed.
+
+    """
+    saver = d.save
+    unsaved = ()
+    if isinstance(saver, JournalingSaver):
+        unsaved = saver.unsaved_keys()
+    removed = [k for k in d.iterkeys() if k not in entries and k not in unsaved]
+    changed = [(k, v) for k, v in entries.iteritems() 
+               if k not in unsaved and d.raw_get(k, None) != v]
+    d.delete_many(removed)
+    d.update(changed)
+    keys = removed + [k for k, v in changed]
+    if isinstance(saver, JournalingSaver):
+        # These came from the file so there is nothing to save.
+        saver.forget(keys)
+    return keys
+
+def attach_saver(d, filename):
+    """Set the save function of a dictionary loaded from filename."""
+    dict_type = _get_dictionary_type(filename)
+    d.save = JournalingSaver(d, filename, dict_type.save_dictionary)
+
 def save_dictionary(d, filename, saver):
     # Write the new file to a temp location.
     tmp = filename + '.tmp'
@@ -51,22 +134,151 @@ def save_dictionary(d, filename, saver):
 
     # Then move the new file to the final location.
     shutil.move(tmp, filename)
+
+def journal_started(filename):
+    """When the journal of filename was started, or None if there is none.
+
+    The creation time of the file is used where the platform records it.
+    Elsewhere the earliest time it has, which is when it was last written, is
+    the closest there is.
+
+    """
+    try:
+        st = os.stat(journal_filename(filename))
+    except OSError:
+        return None
+    return getattr(st, 'st_birthtime', min(st.st_ctime, st.st_mtime))
     
-class ThreadedSaver(object):
-    """A callable that saves a dictionary in the background.
-    
-    Also makes sure that there is only one active call at a time.
+class JournalingSaver(object):
+    """A callable that saves a dictionary by journaling its edits.
+
+    Calls only mark the dictionary as dirty. A single background worker appends
+    the entries changed since its last write to the journal of the dictionary
+    once no call has come in for the debounce time, or once the oldest unsaved
+    call is max_latency seconds old, so a burst of edits makes one write. When
+    the journal gets too big or too old the worker compacts it into the main
+    file. flush writes any unsaved edits right away.
+
+    Edits that fail to be written stay unsaved. The worker logs the error and
+    tries again after max_latency or on the next call.
     """
-    def __init__(self, d, filename, saver):
+    def __init__(self, d, filename, saver, debounce=SAVE_DEBOUNCE, 
+                 max_latency=SAVE_MAX_LATENCY):
         self.d = d
         self.filename = filename
         self.saver = saver
+        self.debounce = debounce
+        self.max_latency = max_latency
+        # Guards pending and the dirty times.
         self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        # Serializes writes to the journal and main file.
+        self.io_lock = threading.Lock()
+        self.pending = set()
+        # When the first and last unsaved calls came in.
+        self.dirty_since = None
+        self.last_call = None
+        self.worker = None
+        # When the current journal got its first entry.
+        self.journal_started = journal_started(filename)
+        d.add_entry_listener(self._entry_changed)
+
+    def _entry_changed(self, key):
+        with self.lock:
+            self.pending.add(key)
         
     def __call__(self):
-        t = threading.Thread(target=self.save)
-        t.start()
+        with self.condition:
+            now = time.time()
+            if self.dirty_since is None:
+                self.dirty_since = now
+            self.last_call = now
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run)
+                self.worker.daemon = True
+                self.worker.start()
+            self.condition.notify()
+
+    def flush(self):
+        """Write unsaved edits now."""
+        self._save_pending()
+
+    def unsaved_keys(self):
+        """The keys that changed since they were last written."""
+        with self.lock:
+            return set(self.pending)
+
+    def forget(self, keys):
+        """Don't write keys unless they change again."""
+        with self.lock:
+            self.pending.difference_update(keys)
+        
+    def _run(self):
+        try:
+            while True:
+                with self.condition:
+                    while True:
+                        if self.dirty_since is None:
+                            self.condition.wait()
+                            continue
+                        deadline = min(self.last_call + self.debounce,
+                                       self.dirty_since + self.max_latency)
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                try:
+                    self._save_pending()
+                except Exception:
+                    logging.getLogger(LOGGER_NAME).exception(
+                        'Saving %s failed', self.filename)
+                    with self.condition:
+                        self.condition.wait(self.max_latency)
+        finally:
+            with self.lock:
+                self.worker = None
+
+    def _save_pending(self):
+        with self.io_lock:
+            with self.lock:
+                keys, self.pending = self.pending, set()
+                dirty_since, self.dirty_since = self.dirty_since, None
+            if not keys:
+                return
+            try:
+                size = append_entries(self.filename, self.d, keys)
+            except:
+                with self.lock:
+                    self.pending.update(keys)
+                    if self.dirty_since is None:
+                        self.dirty_since = dirty_since or time.time()
+                        self.last_call = self.last_call or self.dirty_since
+                raise
+            now = time.time()
+            if self.journal_started is None:
+                self.journal_started = now
+            if (size > MAX_JOURNAL_SIZE or 
+                now - self.journal_started > MAX_JOURNAL_AGE):
+                self._compact()
         
-    def save(self):
+    def _compact(self):
+        """Write the whole dictionary to its file and drop the journal."""
+        journal = journal_filename(self.filename)
+        compacting = compacting_filename(self.filename)
+        # Move the journal aside so that if this is interrupted it is replayed
+        # before any later journal.
+        if os.path.exists(journal):
+            if os.path.exists(compacting):
+                with open(compacting, 'ab') as dst:
+                    with open(journal, 'rb') as src:
+                        shutil.copyfileobj(src, dst)
+                os.remove(journal)
+            else:
+                os.rename(journal, compacting)
+        # Edits made after the copy are in pending and go to the new journal.
         with self.lock:
-            save_dictionary(self.d, self.filename, self.saver)
+            entries = self.d.raw_copy()
+        save_dictionary(entries, self.filename, self.saver)
+        self.journal_started = None
+        if os.path.exists(compacting):
+            os.remove(compacting)
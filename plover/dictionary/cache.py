@@ -0,0 +1,124 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A compiled cache of parsed dictionaries.
+
+Parsing a large dictionary is slow so the parsed entries are stored in a
+marshal file next to the source. The cache is keyed on the path, size,
+modification time and content hash of the source so it is only used while the
+source is unchanged.
+
+"""
+
+import hashlib
+import marshal
+import os
+import shutil
+
+from plover.steno_dictionary import StenoDictionary
+
+CACHE_EXTENSION = '.cache'
+# Bump this when the format of the cached entries changes.
+CACHE_VERSION = 1
+
+
+def cache_filename(filename):
+    return filename + CACHE_EXTENSION
+
+
+class DigestReader(object):
+    """A file object wrapper that hashes what is read through it.
+
+    The digest is what load_cache and save_cache take to identify the contents
+    of a source file, so a file can be parsed and hashed in one pass.
+
+    """
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._sha1 = hashlib.sha1()
+        self._size = 0
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self._sha1.update(data)
+        self._size += len(data)
+        return data
+
+    def seek(self, offset):
+        """Only going back to the start is supported."""
+        if offset:
+            raise ValueError('Can only seek to the start')
+        self._fp.seek(0)
+        self._sha1 = hashlib.sha1()
+        self._size = 0
+
+    def digest(self):
+        """The size and hash of what has been read."""
+        return self._size, self._sha1.hexdigest()
+
+
+def file_digest(filename, chunk_size=64 * 1024):
+    """The size and hash of a file, as DigestReader.digest returns them."""
+    with open(filename, 'rb') as f:
+        reader = DigestReader(f)
+        while reader.read(chunk_size):
+            pass
+    return reader.digest()
+
+
+def _cache_key(filename, digest):
+    """The header that must match for the cache to be used."""
+    size, sha1 = digest
+    return (CACHE_VERSION, marshal.version, os.path.abspath(filename), 
+            size, os.path.getmtime(filename), sha1)
+
+
+def load_cache(filename, digest, d=None):
+    """Load the cached dictionary for a source file.
+
+    Arguments:
+
+    filename -- The path of the source dictionary.
+
+    digest -- The digest of the source dictionary from file_digest.
+
+    d -- The dictionary to add the entries to. A new StenoDictionary is used if
+    this is not given.
+
+    Returns the dictionary or None if there is no valid cache.
+
+    """
+    try:
+        with open(cache_filename(filename), 'rb') as f:
+            if marshal.load(f) != _cache_key(filename, digest):
+                return None
+            entries = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if d is None:
+        d = StenoDictionary()
+    d.update(entries)
+    return d
+
+
+def save_cache(filename, digest, d):
+    """Write the cache for a source file and its parsed dictionary.
+
+    Failure to write the cache, e.g. because the directory is read only, is
+    not an error.
+
+    """
+    path = cache_filename(filename)
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            marshal.dump(_cache_key(filename, digest), f)
+            marshal.dump(dict(d.iteritems()), f)
+        shutil.move(tmp, path)
+    except (IOError, OSError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
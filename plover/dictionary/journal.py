@@ -0,0 +1,72 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""A write-ahead journal of dictionary edits.
+
+Rewriting a large dictionary for every added entry is slow so edits are
+appended to a journal file next to the dictionary instead. Each line of the
+journal is a json list: [strokes, translation] for an entry that was set and
+[strokes] for one that was deleted. The journal is replayed on top of the
+dictionary when it is loaded and is emptied when the dictionary is compacted
+into its main file.
+
+While a compaction is running the journal being compacted is moved aside so
+new edits go to a fresh journal. Both are replayed, oldest first, if the
+compaction doesn't finish.
+
+"""
+
+import json
+
+from plover.steno import STROKE_DELIMITER
+
+JOURNAL_EXTENSION = '.journal'
+COMPACTING_EXTENSION = '.compacting'
+
+
+def journal_filename(filename):
+    return filename + JOURNAL_EXTENSION
+
+
+def compacting_filename(filename):
+    return journal_filename(filename) + COMPACTING_EXTENSION
+
+
+def append_entries(filename, d, keys):
+    """Append the current state of keys in d to the journal of filename.
+
+    Returns the size of the journal after writing.
+
+    """
+    lines = []
+    for key in keys:
+        strokes = STROKE_DELIMITER.join(key)
+        value = d.raw_get(key, None)
+        if value is None:
+            lines.append(json.dumps([strokes]))
+        else:
+            lines.append(json.dumps([strokes, value]))
+    with open(journal_filename(filename), 'ab') as f:
+        f.write(''.join(line + '\n' for line in lines))
+        return f.tell()
+
+
+def replay_journal(d, filename):
+    """Apply the journaled edits of filename to d."""
+    for path in (compacting_filename(filename), journal_filename(filename)):
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A partial line from an interrupted write.
+                    continue
+                key = tuple(entry[0].split(STROKE_DELIMITER))
+                if len(entry) > 1:
+                    d[key] = entry[1]
+                elif d.raw_get(key, None) is not None:
+                    del d[key]
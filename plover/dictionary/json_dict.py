@@ -5,6 +5,9 @@
 
 """
 
+import re
+from cStringIO import StringIO
+
 from plover.steno_dictionary import StenoDictionary
 from plover.steno import normalize_steno
 from plover.exception import DictionaryLoaderException
@@ -13,22 +16,143 @@ try:
     import simplejson as json
 except ImportError:
     import json
-    
 
-def load_dictionary(data):
-    """Load a json dictionary from a string."""
+# How much of a file is read at a time.
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# An entry whose key and value are strings without escapes, and the comma or
+# bracket after it.
+SIMPLE_ENTRY = re.compile(r'[ \t\n\r]*"([^"\\\x00-\x1f]*)"[ \t\n\r]*:'
+                          r'[ \t\n\r]*"([^"\\\x00-\x1f]*)"[ \t\n\r]*([,}])')
+
 
-    def h(pairs):
-        return StenoDictionary((normalize_steno(x[0]), x[1]) for x in pairs)
+def load_dictionary(data, d=None):
+    """Load a json dictionary from a string or a file object.
 
+    The file is parsed a chunk at a time and each entry goes straight into the
+    dictionary, so little more than one chunk of it is in memory at once.
+    Entries are added to d if it is given, or else to a new StenoDictionary.
+
+    """
+    if d is None:
+        d = StenoDictionary()
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    if not hasattr(data, 'read'):
+        data = StringIO(data)
     try:
         try:
-            return json.loads(data, object_pairs_hook=h)
+            return _load(data, 'utf-8', d)
         except UnicodeDecodeError:
-            return json.loads(data, 'latin-1', object_pairs_hook=h)
+            d.clear()
+            data.seek(0)
+            return _load(data, 'latin-1', d)
     except ValueError:
         raise DictionaryLoaderException('Dictionary is not valid json.')
-        
+
+
+class _Buffer(object):
+    """The part of a file that has been read but not yet parsed."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.data = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self):
+        """Read more of the file. Returns False at the end of the file."""
+        # Reading at least as much as is left over means a value that doesn't
+        # fit is retried only a few times.
+        data = self.fp.read(max(CHUNK_SIZE, len(self.data) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        if self.pos > CHUNK_SIZE:
+            # Drop what has been parsed.
+            self.data = self.data[self.pos:]
+            self.pos = 0
+        self.data += data
+        return True
+
+    def parse(self, f):
+        """Call f with the data and position and move past what it parsed.
+
+        If f fails because it reached the end of what has been read, more is
+        read and f is called again.
+
+        """
+        while True:
+            try:
+                result, self.pos = f(self.data, self.pos)
+                return result
+            except UnicodeDecodeError:
+                raise
+            except (ValueError, IndexError):
+                if not self.read():
+                    raise ValueError('Invalid json')
+
+
+def _load(fp, encoding, d):
+    scanstring = json.decoder.scanstring
+    scan_value = json.JSONDecoder(encoding).raw_decode
+
+    def parse_start(s, pos):
+        pos = WHITESPACE.match(s, pos).end()
+        if s[pos] != '{':
+            raise ValueError('Expecting object')
+        pos = WHITESPACE.match(s, pos + 1).end()
+        # Whether there are any entries.
+        if s[pos] == '}':
+            return False, pos + 1
+        return True, pos
+
+    def parse_entry(s, pos):
+        # An entry is only parsed once the comma or bracket after it is read
+        # so that a value, e.g. a number, can't be cut short.
+        pos = WHITESPACE.match(s, pos).end()
+        if s[pos] != '"':
+            raise ValueError('Expecting property name')
+        key, pos = scanstring(s, pos + 1, encoding, True)
+        pos = WHITESPACE.match(s, pos).end()
+        if s[pos] != ':':
+            raise ValueError('Expecting : delimiter')
+        pos = WHITESPACE.match(s, pos + 1).end()
+        if s[pos] == '"':
+            value, pos = scanstring(s, pos + 1, encoding, True)
+        else:
+            value, pos = scan_value(s, pos)
+        pos = WHITESPACE.match(s, pos).end()
+        c = s[pos]
+        if c not in ',}':
+            raise ValueError('Expecting , delimiter')
+        return (key, value, c == ','), pos + 1
+
+    def entries():
+        more = buf.parse(parse_start)
+        match_simple_entry = SIMPLE_ENTRY.match
+        while more:
+            m = match_simple_entry(buf.data, buf.pos)
+            if m:
+                key, value, c = m.groups()
+                key, value = unicode(key, encoding), unicode(value, encoding)
+                more = c == ','
+                buf.pos = m.end()
+            else:
+                key, value, more = buf.parse(parse_entry)
+            yield normalize_steno(key), value
+
+    buf = _Buffer(fp)
+    d.update(entries())
+    # Nothing but whitespace may follow.
+    while True:
+        buf.pos = WHITESPACE.match(buf.data, buf.pos).end()
+        if buf.pos != len(buf.data):
+            raise ValueError('Extra data')
+        if not buf.read():
+            return d
+
 # TODO: test this
 def save_dictionary(d, fp):
     d = dict(('/'.join(k), v) for k, v in d.iteritems())
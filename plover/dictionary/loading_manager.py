@@ -3,18 +3,49 @@
 
 """Centralized place for dictionary loading operation."""
 
+import marshal
+import multiprocessing
 import threading
-from plover.dictionary.base import load_dictionary
+from plover.dictionary.base import load_dictionary, attach_saver
 from plover.exception import DictionaryLoaderException
+from plover.steno_dictionary import StenoDictionary, CompactStenoDictionary
 
 class DictionaryLoadingManager(object):
-    def __init__(self):
+    """Loads dictionaries in the background and keeps them for reuse.
+
+    By default each file is parsed in its own thread. With a process count
+    set, files are parsed in a pool of worker processes instead so that
+    parsing several files isn't serialized by the GIL. With compact set, the
+    dictionaries are loaded as CompactStenoDictionary.
+
+    """
+    def __init__(self, processes=0, compact=False):
         self.dictionaries = {}
+        self.processes = processes
+        self.compact = compact
+        self._pool = None
         
+    def set_process_count(self, processes):
+        """Set the number of worker processes, 0 to load in threads."""
+        self.processes = processes
+
+    def set_compact(self, compact):
+        """Set whether dictionaries are loaded as CompactStenoDictionary."""
+        if compact != self.compact:
+            # The dictionaries kept for reuse are the wrong kind.
+            self.dictionaries = {}
+        self.compact = compact
+
     def start_loading(self, filename):
         if filename in self.dictionaries:
             return self.dictionaries[filename]
-        op = DictionaryLoadingOperation(filename)
+        if self.processes:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.processes)
+            op = ProcessDictionaryLoadingOperation(filename, self._pool, 
+                                                   self.compact)
+        else:
+            op = DictionaryLoadingOperation(filename, self.compact)
         self.dictionaries[filename] = op
         return op
         
@@ -22,26 +53,67 @@ class DictionaryLoadingManager(object):
         self.dictionaries = {f: self.start_loading(f) for f in filenames}
         # Result must be in order given so can't just use values().
         ops = [self.dictionaries[f] for f in filenames]
-        results = [op.get() for op in ops]
+        try:
+            results = [op.get() for op in ops]
+        finally:
+            # Let the workers exit once their queued work is done.
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
         dicts = []
         for d, e in results:
             if e:
                 raise e
             dicts.append(d)
         return dicts
+
+    def load_progressively(self, filenames, callback):
+        """Load dictionaries without waiting for them.
+
+        callback is called from a background thread each time a file finishes
+        loading with: a list of (filename, dictionary) pairs for the files 
+        loaded so far, in the order given; the DictionaryLoaderException for 
+        the file that just finished or None; and the number of files that are 
+        still loading.
+
+        """
+        self.dictionaries = {f: self.start_loading(f) for f in filenames}
+        ops = [self.dictionaries[f] for f in filenames]
+        pool, self._pool = self._pool, None
+        results = [None] * len(ops)
+        lock = threading.Lock()
+        
+        def wait(i):
+            d, e = ops[i].get()
+            with lock:
+                results[i] = d, e
+                remaining = results.count(None)
+                if not remaining and pool is not None:
+                    pool.close()
+                pairs = [(f, r[0]) for f, r in zip(filenames, results) 
+                         if r is not None and r[0] is not None]
+                callback(pairs, e, remaining)
+
+        if not ops:
+            callback([], None, 0)
+        for i in xrange(len(ops)):
+            t = threading.Thread(target=wait, args=(i,))
+            t.daemon = True
+            t.start()
         
         
 class DictionaryLoadingOperation(object):
-    def __init__(self, filename):
+    def __init__(self, filename, compact=False):
         self.loading_thread = threading.Thread(target=self.load)
         self.filename = filename
+        self.compact = compact
         self.exception = None
         self.dictionary = None
         self.loading_thread.start()
         
     def load(self):
         try:
-            self.dictionary = load_dictionary(self.filename)
+            self.dictionary = load_dictionary(self.filename, self.compact)
         except DictionaryLoaderException as e:
             self.exception = e
         
@@ -49,4 +121,41 @@ class DictionaryLoadingOperation(object):
         self.loading_thread.join()
         return self.dictionary, self.exception
 
+
+def _load_in_worker(filename):
+    """Parse a dictionary in a worker process.
+
+    Returns the marshalled entries and an error message, one of which is None.
+
+    """
+    try:
+        d = load_dictionary(filename)
+    except DictionaryLoaderException as e:
+        return None, unicode(e)
+    return marshal.dumps(dict(d.iteritems())), None
+
+
+class ProcessDictionaryLoadingOperation(object):
+    def __init__(self, filename, pool, compact=False):
+        self.filename = filename
+        self.compact = compact
+        self.exception = None
+        self.dictionary = None
+        self._result = pool.apply_async(_load_in_worker, (filename,))
+        
+    def get(self):
+        if self._result is not None:
+            data, error = self._result.get()
+            self._result = None
+            if error is None:
+                if self.compact:
+                    self.dictionary = CompactStenoDictionary()
+                else:
+                    self.dictionary = StenoDictionary()
+                self.dictionary.update(marshal.loads(data))
+                attach_saver(self.dictionary, self.filename)
+            else:
+                self.exception = DictionaryLoaderException(error)
+        return self.dictionary, self.exception
+
 manager = DictionaryLoadingManager()
@@ -13,6 +13,7 @@ http://www.legalxml.org/workgroups/substantive/transcripts/cre-spec.htm
 
 """
 
+from cStringIO import StringIO
 import inspect
 import re
 from plover.steno import normalize_steno
@@ -20,11 +21,10 @@ from plover.steno_dictionary import StenoDictionary
 # TODO: Move dictionary format somewhere more caninical than formatting.
 from plover.formatting import META_RE
 
-# A regular expression to capture an individual entry in the dictionary.
-DICT_ENTRY_PATTERN = re.compile(r'(?s)(?<!\\){\\\*\\cxs (?P<steno>[^}]+)}' + 
-                                r'(?P<translation>.*?)(?:(?<!\\)(?:\r\n|\n))*?'+
-                                r'(?=(?:(?<!\\){\\\*\\cxs [^}]+})|' +
-                                r'(?:(?:(?<!\\)(?:\r\n|\n)\s*)*}\s*\Z))')
+# Every entry starts with this, unless it is escaped.
+ENTRY_START = '{\\*\\cxs '
+# How much of a file is read at a time.
+CHUNK_SIZE = 64 * 1024
 
 class TranslationConverter(object):
     """Convert an RTF/CRE translation into plover's internal format."""
@@ -37,12 +37,31 @@ class TranslationConverter(object):
         
         handler_funcs = inspect.getmembers(self, inspect.ismethod)
         handler_funcs.sort(key=linenumber)
-        handlers = [self._make_re_handler(f.__doc__, f)
-                    for name, f in handler_funcs 
-                    if name.startswith('_re_handle_')]
-        handlers.append(self._match_nested_command_group)
+        # Only the handlers that can match the character at a position are
+        # tried there, in the order they are defined. Handlers not listed here
+        # only match text.
+        first_chars = {
+            'escapedchar': '\\',
+            'hardspace': '\\',
+            'dash': '\\',
+            'escaped_newline': '\\',
+            'infix': '\\',
+            'suffix': '\\',
+            'commands': '\\',
+            'simple_command_group': '{',
+            'eclipse_command': '{',
+        }
+        # Nothing matches at a closing bracket or an unescaped newline.
+        dispatch = dict((c, []) for c in '\\{}\r\n')
+        text_handlers = []
+        for name, f in handler_funcs:
+            if name.startswith('_re_handle_'):
+                c = first_chars.get(name[len('_re_handle_'):])
+                handlers = dispatch[c] if c else text_handlers
+                handlers.append(self._make_re_handler(f.__doc__, f))
+        dispatch['{'].append(self._match_nested_command_group)
         def handler(s, pos):
-            for handler in handlers:
+            for handler in dispatch.get(s[pos], text_handlers):
                 result = handler(s, pos)
                 if result:
                     return result
@@ -282,18 +301,138 @@ def load_stylesheet(s):
     """Returns a dictionary mapping a number to a style name."""
     return dict((int(k), v) for k, v in STYLESHEET_RE.findall(s))
 
-def load_dictionary(s):
-    """Load an RTF/CRE dictionary."""
-    styles = load_stylesheet(s)
-    d = {}
+def _strip_newlines(s):
+    """Remove the unescaped newlines from the end of s."""
+    end = len(s)
+    while end:
+        if s[end - 2:end] == '\r\n' and (end == 2 or s[end - 3] != '\\'):
+            end -= 2
+        elif s[end - 1] == '\n' and (end == 1 or s[end - 2] != '\\'):
+            end -= 1
+        else:
+            break
+    return s[:end]
+
+def _last_translation(s):
+    """Get the translation of the last entry from the rest of the file.
+
+    The file ends with the bracket closing the document, which comes right
+    after the translation or after whitespace starting with an unescaped
+    newline. Returns None if the file doesn't end that way.
+
+    """
+    s = s.rstrip()
+    if not s.endswith('}'):
+        return None
+    s = s[:-1]
+    pos = len(s.rstrip())
+    while pos < len(s):
+        if ((s[pos] == '\n' or s.startswith('\r\n', pos)) and 
+            (pos == 0 or s[pos - 1] != '\\')):
+            return s[:pos]
+        pos += 1
+    return s
+
+class _EntryReader(object):
+    """Split an RTF/CRE file into its header and entries as it is read.
+
+    Only the part of the file from the current entry on is kept in memory.
+
+    """
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._chunk_size = CHUNK_SIZE
+        self._buffer = ''
+        self._eof = False
+        self._entry = None
+
+    def _read(self):
+        """Read the next chunk into the buffer. Returns False at the end."""
+        if not self._eof:
+            data = self._fp.read(self._chunk_size)
+            self._buffer += data
+            self._eof = not data
+        return not self._eof
+
+    def _find_entry(self, pos):
+        """Find the first entry at or after pos in the buffer.
+
+        Returns the positions where the entry starts and where its steno ends,
+        or None if there are no more entries.
+
+        """
+        while True:
+            buf = self._buffer
+            start = buf.find(ENTRY_START, pos)
+            if start == -1:
+                # The start of an entry may be split between chunks.
+                pos = max(pos, len(buf) - len(ENTRY_START) + 1)
+            elif start and buf[start - 1] == '\\':
+                pos = start + 1
+                continue
+            else:
+                steno_end = buf.find('}', start + len(ENTRY_START))
+                if steno_end == start + len(ENTRY_START):
+                    pos = start + 1
+                    continue
+                if steno_end != -1:
+                    return start, steno_end
+                pos = start
+            if not self._read():
+                return None
+
+    def read_header(self):
+        """Return everything before the first entry."""
+        self._entry = self._find_entry(0)
+        if self._entry is None:
+            return self._buffer
+        return self._buffer[:self._entry[0]]
+
+    def entries(self):
+        """Yield the steno and translation of each entry after the header."""
+        entry = self._entry
+        while entry:
+            start, steno_end = entry
+            steno = self._buffer[start + len(ENTRY_START):steno_end]
+            entry = self._find_entry(steno_end + 1)
+            if entry:
+                translation = self._buffer[steno_end + 1:entry[0]]
+                translation = _strip_newlines(translation)
+                if entry[0] > self._chunk_size:
+                    # Drop what has been parsed.
+                    self._buffer = self._buffer[entry[0]:]
+                    entry = (0, entry[1] - entry[0])
+            else:
+                while self._read():
+                    pass
+                translation = _last_translation(self._buffer[steno_end + 1:])
+                if translation is None:
+                    return
+            yield steno, translation
+
+def load_dictionary(s, d=None):
+    """Load an RTF/CRE dictionary from a string or a file object.
+
+    Entries are added to d if it is given, or else to a new StenoDictionary.
+
+    """
+    if d is None:
+        d = StenoDictionary()
+    if not hasattr(s, 'read'):
+        s = StringIO(s)
+    reader = _EntryReader(s)
+    styles = load_stylesheet(reader.read_header())
     converter = TranslationConverter(styles)
-    for m in DICT_ENTRY_PATTERN.finditer(s):
-        steno = normalize_steno(m.group('steno'))
-        translation = m.group('translation')
-        converted = converter(translation)
-        if converted is not None:
-            d[steno] = converted
-    return StenoDictionary(d)
+
+    def entries():
+        for steno, translation in reader.entries():
+            converted = converter(translation)
+            if converted is not None:
+                yield normalize_steno(steno), converted
+
+    d.update(entries())
+    return d
 
 
 HEADER = ("{\\rtf1\\ansi{\\*\\cxrev100}\\cxdict{\\*\\cxsystem Plover}" +
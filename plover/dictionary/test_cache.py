@@ -0,0 +1,72 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for cache.py."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+from plover.dictionary.cache import (load_cache, save_cache, cache_filename, 
+                                     file_digest)
+from plover.dictionary.base import load_dictionary
+from plover.steno_dictionary import StenoDictionary, CompactStenoDictionary
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'dict.json')
+        
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        
+    def write(self, data, mtime=None):
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+    
+    def test_cache(self):
+        self.write('{"S": "a"}', 1000)
+        digest = file_digest(self.filename)
+        self.assertIsNone(load_cache(self.filename, digest))
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T', '-P')] = u'\xf1'
+        save_cache(self.filename, digest, d)
+        self.assertEqual(load_cache(self.filename, digest)._dict, d._dict)
+        self.assertEqual(load_cache(self.filename, digest).longest_key, 2)
+        
+        # Any change to the source invalidates the cache.
+        self.write('{"S": "a"}', 2000)
+        self.assertIsNone(load_cache(self.filename, file_digest(self.filename)))
+        self.write('{"S": "b"}', 1000)
+        self.assertIsNone(load_cache(self.filename, file_digest(self.filename)))
+
+    def test_corrupt_cache(self):
+        self.write('{"S": "a"}')
+        with open(cache_filename(self.filename), 'wb') as f:
+            f.write('garbage')
+        self.assertIsNone(load_cache(self.filename, file_digest(self.filename)))
+
+    def test_load_dictionary(self):
+        self.write('{"S": "a", "T/-P": "b"}')
+        expected = {('S',): 'a', ('T', '-P'): 'b'}
+        self.assertEqual(load_dictionary(self.filename)._dict, expected)
+        self.assertTrue(os.path.exists(cache_filename(self.filename)))
+        # The second load comes from the cache.
+        with patch('plover.dictionary.json_dict.load_dictionary') as loader:
+            d = load_dictionary(self.filename)
+            self.assertFalse(loader.called)
+        self.assertEqual(d._dict, expected)
+        self.assertIsNotNone(d.save)
+        d = load_dictionary(self.filename, compact=True)
+        self.assertIsInstance(d, CompactStenoDictionary)
+        self.assertEqual(d.raw_copy(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
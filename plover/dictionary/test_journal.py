@@ -0,0 +1,227 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for journal.py."""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from mock import patch
+from plover.dictionary.base import (load_dictionary, load_overlay, 
+                                    JournalingSaver)
+from plover.dictionary.journal import (append_entries, replay_journal, 
+                                       journal_filename, compacting_filename)
+from plover.steno_dictionary import (StenoDictionary, CompactStenoDictionary,
+                                     StenoDictionaryCollection)
+
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'dict.json')
+        
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_main_file(self):
+        with open(self.filename, 'rb') as f:
+            return json.load(f)
+        
+    def test_append_and_replay(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T', '-P')] = u'\xf1\n'
+        append_entries(self.filename, d, [('S',), ('T', '-P')])
+        del d[('S',)]
+        append_entries(self.filename, d, [('S',)])
+        # An interrupted write leaves a partial line.
+        with open(journal_filename(self.filename), 'ab') as f:
+            f.write('["W", "b')
+        
+        d2 = StenoDictionary()
+        d2[('S',)] = 'c'
+        d2[('W',)] = 'd'
+        replay_journal(d2, self.filename)
+        self.assertEqual(d2._dict, {('T', '-P'): u'\xf1\n', ('W',): 'd'})
+        
+        # An unfinished compaction is replayed first.
+        with open(compacting_filename(self.filename), 'wb') as f:
+            f.write('["S", "e"]\n["T/-P", "f"]\n')
+        d3 = StenoDictionary()
+        replay_journal(d3, self.filename)
+        self.assertEqual(d3._dict, {('T', '-P'): u'\xf1\n'})
+
+    def test_saver(self):
+        with open(self.filename, 'wb') as f:
+            f.write('{"S": "a", "T": "b"}')
+        d = load_dictionary(self.filename)
+        d[('S',)] = 'c'
+        d[('W', '-P')] = 'd'
+        del d[('T',)]
+        d.save()
+        d.save.flush()
+        # The main file is untouched.
+        self.assertEqual(self.read_main_file(), {'S': 'a', 'T': 'b'})
+        d = load_dictionary(self.filename)
+        expected = {('S',): 'c', ('W', '-P'): 'd'}
+        self.assertEqual(d._dict, expected)
+        
+        d[('S',)] = 'e'
+        d.save()
+        with patch('plover.dictionary.base.MAX_JOURNAL_SIZE', 0):
+            d.save.flush()
+        self.assertEqual(self.read_main_file(), {'S': 'e', 'W/-P': 'd'})
+        self.assertFalse(os.path.exists(journal_filename(self.filename)))
+        self.assertFalse(os.path.exists(compacting_filename(self.filename)))
+        self.assertEqual(load_dictionary(self.filename)._dict, 
+                         {('S',): 'e', ('W', '-P'): 'd'})
+
+    def test_old_journal_is_compacted(self):
+        with open(self.filename, 'wb') as f:
+            f.write('{"S": "a"}')
+        d = load_dictionary(self.filename)
+        d[('T',)] = 'b'
+        d.save.flush()
+        # The age of a journal left from an earlier run counts.
+        old = time.time() - 2 * 60 * 60
+        os.utime(journal_filename(self.filename), (old, old))
+        d = load_dictionary(self.filename)
+        d[('W',)] = 'c'
+        d.save.flush()
+        self.assertEqual(self.read_main_file(), 
+                         {'S': 'a', 'T': 'b', 'W': 'c'})
+        self.assertFalse(os.path.exists(journal_filename(self.filename)))
+
+    def test_overlay(self):
+        # The file doesn't have to exist.
+        d = load_overlay(self.filename)
+        self.assertEqual(len(d), 0)
+        d[('S',)] = 'a'
+        d.save()
+        d.save.flush()
+        self.assertFalse(os.path.exists(self.filename))
+        d = load_overlay(self.filename)
+        self.assertEqual(d._dict, {('S',): 'a'})
+        d[('T',)] = 'b'
+        d.save()
+        with patch('plover.dictionary.base.MAX_JOURNAL_SIZE', 0):
+            d.save.flush()
+        self.assertEqual(self.read_main_file(), {'S': 'a', 'T': 'b'})
+        self.assertEqual(load_overlay(self.filename)._dict, 
+                         {('S',): 'a', ('T',): 'b'})
+
+    def test_compact_overlay(self):
+        d = load_overlay(self.filename, compact=True)
+        self.assertIsInstance(d, CompactStenoDictionary)
+        d[('S',)] = 'a'
+        d.save.flush()
+        d = load_overlay(self.filename, compact=True)
+        self.assertIsInstance(d, CompactStenoDictionary)
+        self.assertEqual(d.raw_copy(), {('S',): 'a'})
+        with patch('plover.dictionary.base.MAX_JOURNAL_SIZE', 0):
+            d[('T',)] = 'b'
+            d.save.flush()
+        d = load_overlay(self.filename, compact=True)
+        self.assertIsInstance(d, CompactStenoDictionary)
+        self.assertEqual(d.raw_copy(), {('S',): 'a', ('T',): 'b'})
+
+    def test_saver_coalesces_writes(self):
+        d = StenoDictionary()
+        saver = JournalingSaver(d, self.filename, None, debounce=0.05, 
+                                max_latency=10)
+        writes = []
+        def append(filename, d, keys):
+            writes.append(sorted(keys))
+            return 0
+        with patch('plover.dictionary.base.append_entries', append):
+            for key in ('S', 'T', 'P'):
+                d[(key,)] = 'a'
+                saver()
+            deadline = time.time() + 5
+            while not writes and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            self.assertEqual(writes, [[('P',), ('S',), ('T',)]])
+            # Nothing left to flush.
+            saver.flush()
+            self.assertEqual(len(writes), 1)
+        
+    def test_saver_write_failure(self):
+        d = StenoDictionary()
+        saver = JournalingSaver(d, self.filename, None, debounce=0.01, 
+                                max_latency=0.05)
+        failures = []
+        def fail(filename, d, keys):
+            failures.append(sorted(keys))
+            raise IOError('disk full')
+        with patch('plover.dictionary.base.append_entries', fail):
+            d[('S',)] = 'a'
+            self.assertRaises(IOError, saver.flush)
+            # The edit is still unsaved.
+            self.assertEqual(saver.unsaved_keys(), set([('S',)]))
+            saver()
+            deadline = time.time() + 5
+            while len(failures) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(failures[1], [('S',)])
+            self.assertTrue(saver.worker.is_alive())
+        # The worker tries again and saves it along with later edits.
+        d[('T',)] = 'b'
+        saver()
+        deadline = time.time() + 5
+        while saver.unsaved_keys() and time.time() < deadline:
+            time.sleep(0.01)
+        with saver.io_lock:
+            pass
+        d2 = StenoDictionary()
+        replay_journal(d2, self.filename)
+        self.assertEqual(d2._dict, {('S',): 'a', ('T',): 'b'})
+
+    def test_collection_flush_failure(self):
+        other = os.path.join(self.dir, 'other.json')
+        for filename in (self.filename, other):
+            with open(filename, 'wb') as f:
+                f.write('{}')
+        d1 = load_dictionary(self.filename)
+        d2 = load_dictionary(other)
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([d2, d1])
+        d1[('S',)] = 'a'
+        d2[('T',)] = 'b'
+        append = append_entries
+        def fail_first(filename, d, keys):
+            if filename == self.filename:
+                raise IOError('read only')
+            return append(filename, d, keys)
+        with patch('plover.dictionary.base.append_entries', fail_first):
+            self.assertRaises(IOError, dc.flush)
+        # The other dictionary is still saved.
+        self.assertEqual(load_dictionary(other)._dict, {('T',): 'b'})
+        self.assertEqual(d1.save.unsaved_keys(), set([('S',)]))
+        dc.flush()
+        self.assertEqual(load_dictionary(self.filename)._dict, {('S',): 'a'})
+
+    def test_saver_max_latency(self):
+        d = StenoDictionary()
+        saver = JournalingSaver(d, self.filename, None, debounce=10, 
+                                max_latency=0.05)
+        d[('S',)] = 'a'
+        saver()
+        deadline = time.time() + 5
+        while (not os.path.exists(journal_filename(self.filename)) and 
+               time.time() < deadline):
+            time.sleep(0.01)
+        # Wait for the write to finish.
+        with saver.io_lock:
+            pass
+        d2 = StenoDictionary()
+        replay_journal(d2, self.filename)
+        self.assertEqual(d2._dict, {('S',): 'a'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@
 """Unit tests for json.py."""
 
 import unittest
+from mock import patch
+from StringIO import StringIO
 from json_dict import load_dictionary
 from base import DictionaryLoaderException
 
@@ -20,5 +22,15 @@ class JsonDictionaryTestCase(unittest.TestCase):
         with self.assertRaises(DictionaryLoaderException):
             load_dictionary('foo')
 
+    def test_load_in_chunks(self):
+        data = '{"S": "a",\n "T/-P": 3, "KWR": "\xc3\xb1 \\"b\\""}\n'
+        expected = {('S',): 'a', ('T', '-P'): 3, ('KWR',): u'\xf1 "b"'}
+        for chunk_size in (1, 2, 7, 1000):
+            with patch('plover.dictionary.json_dict.CHUNK_SIZE', chunk_size):
+                self.assertEqual(load_dictionary(StringIO(data))._dict, 
+                                 expected)
+                with self.assertRaises(DictionaryLoaderException):
+                    load_dictionary(StringIO(data + ','))
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,9 +4,14 @@
 """Tests for loading_manager.py."""
 
 from collections import defaultdict
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 from mock import patch
 import plover.dictionary.loading_manager as loading_manager
+from plover.exception import DictionaryLoaderException
 
 
 class DictionaryLoadingManagerTestCase(unittest.TestCase):
@@ -17,7 +22,7 @@ class DictionaryLoadingManagerTestCase(unittest.TestCase):
                 self.files = files
                 self.load_counts = defaultdict(int)
                 
-            def __call__(self, filename):
+            def __call__(self, filename, compact=False):
                 self.load_counts[filename] += 1
                 return self.files[filename]
                 
@@ -36,5 +41,53 @@ class DictionaryLoadingManagerTestCase(unittest.TestCase):
             self.assertEqual(['b', 'c'], sorted(manager.dictionaries.keys()))
 
 
+    def test_progressive_loading(self):
+        events = threading.Semaphore(0)
+        gates = {c: threading.Event() for c in 'abc'}
+        def loader(filename, compact=False):
+            gates[filename].wait()
+            if filename == 'b':
+                raise DictionaryLoaderException('b')
+            return filename * 5
+        calls = []
+        def callback(pairs, exception, remaining):
+            calls.append((pairs, exception and unicode(exception), remaining))
+            events.release()
+        with patch('plover.dictionary.loading_manager.load_dictionary', loader):
+            manager = loading_manager.DictionaryLoadingManager()
+            manager.load_progressively(['a', 'b', 'c'], callback)
+            for c in 'cba':
+                gates[c].set()
+                events.acquire()
+        self.assertEqual(calls, [([('c', 'ccccc')], None, 2),
+                                 ([('c', 'ccccc')], u'b', 1),
+                                 ([('a', 'aaaaa'), ('c', 'ccccc')], None, 0)])
+
+    def test_process_loading(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            files = {}
+            for name, data in (('a.json', '{"S": "a"}'), 
+                               ('b.json', '{"T/-P": "b"}'),
+                               ('c.json', 'not json')):
+                files[name] = os.path.join(tmp, name)
+                with open(files[name], 'wb') as f:
+                    f.write(data)
+            manager = loading_manager.DictionaryLoadingManager(processes=2)
+            results = manager.load([files['b.json'], files['a.json']])
+            # Returns the right values in the right order.
+            self.assertEqual([d._dict for d in results], 
+                             [{('T', '-P'): 'b'}, {('S',): 'a'}])
+            self.assertEqual(results[0].longest_key, 2)
+            self.assertIsNotNone(results[0].save)
+            # Already loaded dictionaries are reused.
+            self.assertIs(manager.load([files['a.json']])[0], results[1])
+            # Errors are raised in the main process.
+            with self.assertRaises(DictionaryLoaderException):
+                manager.load([files['a.json'], files['c.json']])
+        finally:
+            shutil.rmtree(tmp)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -171,16 +171,26 @@ class TestCase(unittest.TestCase):
         # Conflicts result on only the last one kept.
         ('{\\*\\cxs T}t{\\*\\cxs T}g', {'T': 'g'}),
         ('{\\*\\cxs T}t{\\*\\cxs T}return_none', {'T': 't'}),
+        # An escaped bracket doesn't start an entry.
+        ('{\\*\\cxs S}a\\{\\*\\cxs T}b', {'S': 'a\\{\\*\\cxs T}b'}),
+        # Entries long enough to be dropped from the buffer once parsed.
+        ('{\\*\\cxs S}' + 'a' * 20 + '\r\n{\\*\\cxs T/-P}' + 'b' * 30 + 
+         '\r\n{\\*\\cxs W}c', 
+         {'S': 'a' * 20, 'T/-P': 'b' * 30, 'W': 'c'}),
         
         )
         
         patch_path = 'plover.dictionary.rtfcre_dict'
         with mock.patch.multiple(patch_path, normalize_steno=normalize, 
                                  TranslationConverter=Converter):
-            for s, expected in cases:
-                expected = dict((normalize(k), convert(v)) 
-                                for k, v in expected.iteritems())
-                assertEqual(load_dictionary(make_dict(s)), expected)
+            # Entries can be split anywhere between the chunks of the file.
+            for chunk_size in (1, 2, 7, 1000):
+                with mock.patch(patch_path + '.CHUNK_SIZE', chunk_size):
+                    for s, expected in cases:
+                        expected = dict((normalize(k), convert(v)) 
+                                        for k, v in expected.iteritems())
+                        assertEqual(load_dictionary(StringIO(make_dict(s))), 
+                                    expected)
 
     def test_format_translation(self):
         cases = (
@@ -0,0 +1,94 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Tests for watcher.py."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from plover.dictionary.base import load_dictionary, update_dictionary
+from plover.dictionary.watcher import DictionaryWatcher
+from plover.steno_dictionary import StenoDictionary
+
+
+def same_thread_hook(fn, *args):
+    fn(*args)
+
+
+class WatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'dict.json')
+        
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, data, mtime):
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_update_dictionary(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T', 'P', 'S')] = 'b'
+        d[('W',)] = 'c'
+        changes = []
+        d.add_entry_listener(lambda key: changes.append(key))
+        longest = []
+        d.add_longest_key_listener(lambda n: longest.append(n))
+        keys = update_dictionary(d, {('S',): 'a', ('W',): 'd', ('P',): 'e'})
+        self.assertEqual(sorted(keys), [('P',), ('T', 'P', 'S'), ('W',)])
+        self.assertEqual(sorted(changes), sorted(keys))
+        self.assertEqual(d._dict, {('S',): 'a', ('W',): 'd', ('P',): 'e'})
+        self.assertEqual(longest, [1])
+        self.assertEqual(d.reverse['d'], [('W',)])
+        self.assertNotIn('c', d.reverse)
+
+    def test_reload(self):
+        self.write('{"S": "a", "T": "b"}', 1000)
+        d = load_dictionary(self.filename)
+        watcher = DictionaryWatcher(same_thread_hook, use_inotify=False)
+        watcher.set_dictionaries([(self.filename, d)])
+        try:
+            watcher.check(self.filename)
+            self.assertEqual(d._dict, {('S',): 'a', ('T',): 'b'})
+            
+            # Unsaved edits are kept.
+            d[('T',)] = 'c'
+            self.write('{"S": "d", "T": "b", "W/-P": "e"}', 2000)
+            watcher.check(self.filename)
+            self.assertEqual(d._dict, 
+                             {('S',): 'd', ('T',): 'c', ('W', '-P'): 'e'})
+            self.assertEqual(d.longest_key, 2)
+            # Reloaded entries aren't saved back.
+            self.assertEqual(d.save.unsaved_keys(), set([('T',)]))
+
+            # A broken file is ignored until it's fixed.
+            self.write('{"S": ', 3000)
+            watcher.check(self.filename)
+            self.assertEqual(d[('S',)], 'd')
+        finally:
+            watcher.stop()
+
+    def test_polling(self):
+        self.write('{"S": "a"}', 1000)
+        d = load_dictionary(self.filename)
+        watcher = DictionaryWatcher(same_thread_hook, poll_interval=0.01, 
+                                    use_inotify=False)
+        watcher.set_dictionaries([(self.filename, d)])
+        try:
+            self.write('{"S": "b"}', 2000)
+            deadline = time.time() + 5
+            while d[('S',)] != 'b' and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(d[('S',)], 'b')
+        finally:
+            watcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Reload dictionaries when their files change on disk.
+
+Changes are detected with inotify when pyinotify is available and by polling
+the size and modification time of the files otherwise. A changed file is parsed
+in the background and only the entries that differ are applied to the loaded
+dictionary, on the engine's thread.
+
+"""
+
+import os
+import threading
+
+from plover.dictionary.base import parse_dictionary, update_dictionary
+from plover.exception import DictionaryLoaderException
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# How often files are checked when polling, in seconds.
+POLL_INTERVAL = 2.0
+
+
+def _file_state(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+class DictionaryWatcher(object):
+    """Watches dictionary files and updates the dictionaries when they change.
+
+    Arguments:
+
+    thread_hook -- A function that takes a function and arguments and calls it
+    on the thread that owns the dictionaries.
+
+    poll_interval -- How often to check the files if inotify isn't available.
+
+    use_inotify -- Whether to use inotify when it's available.
+
+    """
+    def __init__(self, thread_hook, poll_interval=POLL_INTERVAL, 
+                 use_inotify=True):
+        self.thread_hook = thread_hook
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and pyinotify is not None
+        self.lock = threading.Lock()
+        # Maps a filename to its dictionary and the last state of its file.
+        self.watched = {}
+        self._thread = None
+        self._notifier = None
+        self._stop = threading.Event()
+
+    def set_dictionaries(self, pairs):
+        """Watch the given (filename, dictionary) pairs instead of any others."""
+        self.stop()
+        with self.lock:
+            self.watched = dict((os.path.abspath(f), (d, _file_state(f))) 
+                                for f, d in pairs)
+        if not self.watched:
+            return
+        self._stop.clear()
+        if self.use_inotify:
+            self._start_inotify()
+        else:
+            self._thread = threading.Thread(target=self._poll)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._notifier:
+            self._notifier.stop()
+            self._notifier = None
+
+    def check(self, filename):
+        """Reload filename if it changed since it was last seen."""
+        filename = os.path.abspath(filename)
+        with self.lock:
+            if filename not in self.watched:
+                return
+            d, state = self.watched[filename]
+            new_state = _file_state(filename)
+            if new_state is None or new_state == state:
+                return
+            self.watched[filename] = (d, new_state)
+        try:
+            entries = parse_dictionary(filename).raw_copy()
+        except DictionaryLoaderException:
+            # Keep what we have. The file may be in the middle of being saved
+            # and will be picked up on the next change.
+            with self.lock:
+                self.watched[filename] = (d, state)
+            return
+        self.thread_hook(update_dictionary, d, entries)
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            for filename in list(self.watched):
+                self.check(filename)
+
+    def _start_inotify(self):
+        watcher = self
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                watcher.check(event.pathname)
+
+        wm = pyinotify.WatchManager()
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        for directory in set(os.path.dirname(f) for f in self.watched):
+            wm.add_watch(directory, mask)
+        self._notifier = pyinotify.ThreadedNotifier(wm, Handler())
+        self._notifier.daemon = True
+        self._notifier.start()
@@ -65,13 +65,7 @@ class Formatter(object):
         rendered translations. If there is no context then this may be None.
 
         """
-        for t in do:
-            last_action = _get_last_action(prev.formatting if prev else None)
-            if t.english:
-                t.formatting = _translation_to_actions(t.english, last_action)
-            else:
-                t.formatting = _raw_to_actions(t.rtfcre[0], last_action)
-            prev = t
+        apply_formatting(do, prev)
 
         old = [a for t in undo for a in t.formatting]
         new = [a for t in do for a in t.formatting]
@@ -85,6 +79,20 @@ class Formatter(object):
 
         OutputHelper(self._output).render(old[i:], new[i:])
 
+def apply_formatting(translations, prev):
+    """Fill in the formatting of translations, which come after prev.
+
+    prev may be None if there is no context.
+
+    """
+    for t in translations:
+        last_action = _get_last_action(prev.formatting if prev else None)
+        if t.english:
+            t.formatting = _translation_to_actions(t.english, last_action)
+        else:
+            t.formatting = _raw_to_actions(t.rtfcre[0], last_action)
+        prev = t
+
 class OutputHelper(object):
     """A helper class for minimizing the amount of change on output.
 
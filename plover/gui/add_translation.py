@@ -5,6 +5,7 @@ import wx
 from wx.lib.utils import AdjustRectToScreen
 import sys
 from plover.steno import normalize_steno
+from plover.steno_dictionary import ValueFilter
 
 if sys.platform.startswith('win32'):
     import win32gui
@@ -76,6 +77,8 @@ class AddTranslationDialog(wx.Dialog):
     BORDER = 3
     STROKES_TEXT = 'Strokes:'
     TRANSLATION_TEXT = 'Translation:'
+    # How many translations starting with the text typed are suggested.
+    PREFIX_MATCHES = 3
     
     other_instances = []
     
@@ -161,6 +164,7 @@ class AddTranslationDialog(wx.Dialog):
         self.Bind(wx.EVT_MOVE, self.on_move)
         
         self.engine = engine
+        self.stroke_filter = ValueFilter(self.stroke_dict_filter)
         
         # TODO: add functions on engine for state
         self.previous_state = self.engine.translator.get_state()
@@ -215,8 +219,6 @@ class AddTranslationDialog(wx.Dialog):
         self.GetSizer().Layout()
 
     def on_translation_change(self, event):
-        # TODO: normalize dict entries to make reverse lookup more reliable with 
-        # whitespace.
         translation = event.GetString().strip()
         if translation:
             d = self.engine.get_dictionary()
@@ -226,17 +228,23 @@ class AddTranslationDialog(wx.Dialog):
                 label = '%s is mapped from %s' % (translation, strokes)
             else:
                 label = '%s is not in the dictionary' % translation
+                matches = d.reverse_prefix_lookup(translation, 
+                                                  self.PREFIX_MATCHES)
+                if matches:
+                    label += '; did you mean %s' % ', '.join(
+                        '%s (%s)' % (d.raw_lookup(keys[0]), '/'.join(keys[0]))
+                        for text, keys in matches)
         else:
             label = ''
         self.translation_mapping_text.SetLabel(label)
         self.GetSizer().Layout()
         
     def on_strokes_gained_focus(self, event):
-        self.engine.get_dictionary().add_filter(self.stroke_dict_filter)
+        self.engine.get_dictionary().add_filter(self.stroke_filter)
         self.engine.translator.set_state(self.strokes_state)
         
     def on_strokes_lost_focus(self, event):
-        self.engine.get_dictionary().remove_filter(self.stroke_dict_filter)
+        self.engine.get_dictionary().remove_filter(self.stroke_filter)
         self.engine.translator.set_state(self.previous_state)
 
     def on_translation_gained_focus(self, event):
@@ -248,7 +256,7 @@ class AddTranslationDialog(wx.Dialog):
     def on_button_gained_focus(self, event):
         self.strokes_text.SetFocus()
         
-    def stroke_dict_filter(self, key, value):
+    def stroke_dict_filter(self, value):
         # Only allow translations with special entries. Do this by looking for 
         # braces but take into account escaped braces and slashes.
         escaped = value.replace('\\\\', '').replace('\\{', '')
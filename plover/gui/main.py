@@ -173,6 +173,8 @@ class MainFrame(wx.Frame):
             lambda s: wx.CallAfter(self._update_status, s))
         self.steno_engine.set_output(
             Output(self.consume_command, self.steno_engine))
+        self.steno_engine.add_error_listener(
+            lambda e: self._show_alert(unicode(e)))
 
         while True:
             try:
@@ -47,3 +47,8 @@ class Logger(object):
                 self._logger.info('*%s', u)
             for d in do:
                 self._logger.info(d)
+
+    def log_error(self, message):
+        """Log an error whatever else is being logged."""
+        if self._handler:
+            self._logger.error(message)
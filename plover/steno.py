@@ -69,7 +69,16 @@ STENO_KEY_ORDER = {"#": 0,
                    "-Z": 22}
 
 
-class Stroke:
+# Each steno key gets one bit in a stroke's key mask, in steno order. Number
+# keys are the number bar plus the key they replace.
+STENO_KEY_BITS = dict((k, 1 << v) for k, v in STENO_KEY_ORDER.items())
+STENO_KEY_BITS.update((v, STENO_KEY_BITS['#'] | STENO_KEY_BITS[k])
+                      for k, v in STENO_KEY_NUMBERS.items())
+_ORDERED_KEY_BITS = sorted(((k, 1 << v) for k, v in STENO_KEY_ORDER.items()),
+                           key=lambda x: x[1])
+
+
+class Stroke(object):
     """A standardized data model for stenotype machine strokes.
 
     This class standardizes the representation of a stenotype chord. A stenotype
@@ -80,11 +89,31 @@ class Stroke:
     stenographic ordering on the keys, and combines the keys into a single
     string (called RTFCRE for historical reasons).
 
+    Strokes are immutable and interned: constructing a stroke from the same set
+    of keys twice returns the same instance, so the key ordering and RTFCRE
+    string are only computed the first time a chord is seen and equality is an
+    identity check. The following attributes are available:
+
+    steno_keys -- A tuple of the keys in steno order.
+
+    rtfcre -- The RTFCRE string for the stroke.
+
+    keymask -- An integer with one bit set for each standard key in the stroke.
+
+    is_correction -- True if this is the correction stroke.
+
     """
 
+    __slots__ = ('steno_keys', 'rtfcre', 'is_correction', 'keymask')
+
     IMPLICIT_HYPHEN = set(('A-', 'O-', '5-', '0-', '-E', '-U', '*'))
 
-    def __init__(self, steno_keys) :
+    # Maps a key mask to the one Stroke instance for that chord. Chords with
+    # keys that are not standard steno keys are keyed by the mask and a
+    # frozenset of the other keys.
+    _interned = {}
+
+    def __new__(cls, steno_keys):
         """Create a steno stroke by formatting steno keys.
 
         Arguments:
@@ -92,13 +121,33 @@ class Stroke:
         steno_keys -- A sequence of pressed keys.
 
         """
-        # Remove duplicate keys and save local versions of the input 
-        # parameters.
+        mask = 0
+        other_keys = None
+        for key in steno_keys:
+            bit = STENO_KEY_BITS.get(key)
+            if bit is None:
+                if other_keys is None:
+                    other_keys = set()
+                other_keys.add(key)
+            else:
+                mask |= bit
+        if other_keys is None:
+            intern_key = mask
+        else:
+            intern_key = (mask, frozenset(other_keys))
+        stroke = cls._interned.get(intern_key)
+        if stroke is None:
+            stroke = object.__new__(cls)
+            stroke._build(mask, other_keys)
+            # setdefault is atomic so racing threads agree on one instance.
+            stroke = cls._interned.setdefault(intern_key, stroke)
+        return stroke
+
+    def _build(self, mask, other_keys):
+        # Keys are listed in steno order with non-standard keys first.
+        steno_keys = sorted(other_keys) if other_keys else []
+        steno_keys.extend(k for k, bit in _ORDERED_KEY_BITS if mask & bit)
         steno_keys_set = set(steno_keys)
-        steno_keys = list(steno_keys_set)
-
-        # Order the steno keys so comparisons can be made.
-        steno_keys.sort(key=lambda x: STENO_KEY_ORDER.get(x, -1))
          
         # Convert strokes involving the number bar to numbers.
         if '#' in steno_keys:
@@ -111,32 +160,48 @@ class Stroke:
                 steno_keys.remove('#')
         
         if steno_keys_set & self.IMPLICIT_HYPHEN:
-            self.rtfcre = ''.join(key.strip('-') for key in steno_keys)
+            rtfcre = ''.join(key.strip('-') for key in steno_keys)
         else:
             pre = ''.join(k.strip('-') for k in steno_keys if k[-1] == '-' or 
                           k == '#')
             post = ''.join(k.strip('-') for k in steno_keys if k[0] == '-')
-            self.rtfcre = '-'.join([pre, post]) if post else pre
-
-        self.steno_keys = steno_keys
+            rtfcre = '-'.join([pre, post]) if post else pre
 
+        object.__setattr__(self, 'steno_keys', tuple(steno_keys))
+        object.__setattr__(self, 'rtfcre', rtfcre)
+        object.__setattr__(self, 'keymask', mask)
         # Determine if this stroke is a correction stroke.
-        self.is_correction = (self.rtfcre == '*')
+        object.__setattr__(self, 'is_correction', rtfcre == '*')
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Stroke objects are immutable')
+
+    def __reduce__(self):
+        # Unpickled strokes go through __new__ so they are interned too.
+        return (Stroke, (self.steno_keys,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         if self.is_correction:
             prefix = '*'
         else:
             prefix = ''
-        return '%sStroke(%s : %s)' % (prefix, self.rtfcre, self.steno_keys)
+        return '%sStroke(%s : %s)' % (prefix, self.rtfcre,
+                                      list(self.steno_keys))
 
     def __eq__(self, other):
-        return (isinstance(other, Stroke)
-                and self.steno_keys == other.steno_keys)
+        return self is other
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        return self is not other
+
+    def __hash__(self):
+        return id(self)
 
     def __repr__(self):
         return str(self)
-
@@ -7,9 +7,169 @@ A steno dictionary maps sequences of steno strokes to translations.
 
 """
 
+import binascii
+import bisect
 import collections
 import itertools
+import logging
+import threading
 from steno import normalize_steno
+from plover.logger import LOGGER_NAME
+
+# Stands for a missing value in a reverse index update.
+_MISSING = object()
+
+# The number of bits for each stroke of a key packed by a StrokeTable.
+STROKE_BITS = 20
+STROKE_MASK = (1 << STROKE_BITS) - 1
+
+# The number of bits a Bloom filter has for each key it is sized for. With two
+# probes this gives about one false positive in a hundred when it is full.
+BLOOM_BITS_PER_KEY = 16
+
+
+class BloomFilter(object):
+    """A set of keys that can give false positives but never false negatives.
+
+    Each key sets two bits picked from its hash. The number of bits is a power
+    of two, at least BLOOM_BITS_PER_KEY for each of capacity keys, so a filter
+    can be stretched to a bigger size by repeating it, which is how filters
+    are combined. Keys can't be taken out; a filter that had more keys added
+    than it was sized for should be rebuilt.
+
+    """
+    def __init__(self, capacity, keys=()):
+        size = 64
+        while size < capacity * BLOOM_BITS_PER_KEY:
+            size *= 2
+        self._bits = bytearray(size // 8)
+        self._mask = size - 1
+        self.capacity = capacity
+        # The number of keys added, counting keys added twice.
+        self.count = 0
+        self.update(keys)
+
+    def __len__(self):
+        """The number of bits in the filter."""
+        return self._mask + 1
+
+    @property
+    def full(self):
+        """Whether more keys have been added than the filter was sized for."""
+        return self.count > self.capacity
+
+    def add(self, key):
+        h = hash(key)
+        bits = self._bits
+        mask = self._mask
+        i = h & mask
+        bits[i >> 3] |= 1 << (i & 7)
+        i = ((h >> 32) ^ (h >> 11)) & mask
+        bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        h = hash(key)
+        bits = self._bits
+        mask = self._mask
+        i = h & mask
+        if not bits[i >> 3] & (1 << (i & 7)):
+            return False
+        i = ((h >> 32) ^ (h >> 11)) & mask
+        return bits[i >> 3] & (1 << (i & 7)) != 0
+
+    @classmethod
+    def union(cls, filters):
+        """A filter that holds the keys of all of filters."""
+        filters = list(filters)
+        capacity = sum(f.capacity for f in filters)
+        union = cls(capacity)
+        size = len(union._bits)
+        bits = 0
+        for f in filters:
+            # A smaller filter is repeated to stretch it to the bigger size.
+            stretched = f._bits * (size // len(f._bits))
+            bits |= int(binascii.hexlify(stretched) or '0', 16)
+        union._bits = bytearray(binascii.unhexlify('%0*x' % (size * 2, bits)))
+        union.count = sum(f.count for f in filters)
+        return union
+
+
+class ValueFilter(object):
+    """A filter that only looks at the translation of an entry.
+
+    Like any filter, it is called with a key and a value and returns True to
+    hide the entry, but the answer only depends on the value, so dictionaries
+    and collections remember it for each entry instead of asking again.
+
+    """
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def __call__(self, key, value):
+        return self.predicate(value)
+
+
+class _FilterList(list):
+    """The filters of a dictionary or collection.
+
+    For each entry looked up, whether a ValueFilter hides it is remembered
+    along with the value, so the value filters are run again only when the
+    entry changes or the filters do.
+
+    """
+    def __init__(self):
+        list.__init__(self)
+        self._value_filters = []
+        self._key_filters = []
+        # Maps a key to its value when it was checked and whether a value
+        # filter hid it.
+        self._flags = {}
+
+    def append(self, f):
+        list.append(self, f)
+        self._changed()
+
+    def remove(self, f):
+        list.remove(self, f)
+        self._changed()
+
+    def _changed(self):
+        self._value_filters = [f for f in self if isinstance(f, ValueFilter)]
+        self._key_filters = [f for f in self if not isinstance(f, ValueFilter)]
+        self._flags.clear()
+
+    def filtered(self, key, value, unpack=None):
+        """Whether a filter hides the entry of key and value.
+
+        unpack, if given, turns key into the key the other filters are given.
+
+        """
+        if self._value_filters:
+            flags = self._flags.get(key)
+            if flags is not None and flags[0] is value:
+                hidden = flags[1]
+            else:
+                hidden = False
+                for f in self._value_filters:
+                    if f.predicate(value):
+                        hidden = True
+                        break
+                self._flags[key] = (value, hidden)
+            if hidden:
+                return True
+        if self._key_filters:
+            if unpack is not None:
+                key = unpack(key)
+            for f in self._key_filters:
+                if f(key, value):
+                    return True
+        return False
+
 
 class StenoDictionary(collections.MutableMapping):
     """A steno dictionary.
@@ -24,10 +184,21 @@ class StenoDictionary(collections.MutableMapping):
     """
     def __init__(self, *args, **kw):
         self._dict = {}
+        # Maps each proper prefix of a key to the number of keys that start 
+        # with it.
+        self._prefixes = collections.defaultdict(int)
         self._longest_key_length = 0
+        # The number of keys of each length, indexed by length.
+        self._key_lengths = [0]
+        # Whether longest key listeners are held back until a batch is done.
+        self._batching = False
         self._longest_listener_callbacks = set()
-        self.reverse = collections.defaultdict(list)
-        self.filters = []
+        self._entry_listener_callbacks = set()
+        # A BloomFilter of the keys, once it is built.
+        self._bloom_filter = None
+        # Maps each value to the keys that have it, once it is built.
+        self._reverse = None
+        self.filters = _FilterList()
         self.update(*args, **kw)
         self.save = None
 
@@ -44,35 +215,103 @@ class StenoDictionary(collections.MutableMapping):
 
     def __getitem__(self, key):
         value = self._dict.__getitem__(key)
-        for f in self.filters:
-            if f(key, value):
-                raise KeyError('(%s, %s) is filtered' % (str(key), str(value)))
+        if self.filters and self.filters.filtered(key, value):
+            raise KeyError('(%s, %s) is filtered' % (str(key), str(value)))
         return value
 
     def __setitem__(self, key, value):
-        self._longest_key = max(self._longest_key, len(key))
+        old = self._dict.get(key, _MISSING)
+        if old is _MISSING:
+            self._add_key_length(len(key))
+            prefixes = self._prefixes
+            for i in xrange(1, len(key)):
+                prefixes[key[:i]] += 1
         self._dict.__setitem__(key, value)
-        self.reverse[value].append(key)
+        if self._bloom_filter is not None:
+            self._bloom_filter.add(key)
+        if self._reverse is not None:
+            self._update_reverse(key, old, value)
+        for callback in self._entry_listener_callbacks:
+            callback(key)
 
     def __delitem__(self, key):
-        value = self._dict[key]
-        self.reverse[value].remove(key)
-        self._dict.__delitem__(key)
-        if len(key) == self.longest_key:
-            if self._dict:
-                self._longest_key = max(len(x) for x in self._dict.iterkeys())
+        value = self._dict.pop(key)
+        if self._reverse is not None:
+            self._update_reverse(key, value, _MISSING)
+        prefixes = self._prefixes
+        for i in xrange(1, len(key)):
+            prefix = key[:i]
+            count = prefixes[prefix] - 1
+            if count:
+                prefixes[prefix] = count
             else:
-                self._longest_key = 0
+                del prefixes[prefix]
+        for callback in self._entry_listener_callbacks:
+            callback(key)
+        self._remove_key_length(len(key))
 
     def __contains__(self, key):
         contained = self._dict.__contains__(key)
         if not contained:
             return False
         value = self._dict[key]
-        for f in self.filters:
-            if f(key, value):
-                return False
-        return True
+        return not (self.filters and self.filters.filtered(key, value))
+
+    @property
+    def reverse(self):
+        """A read only map from each value to a list of the keys that have it.
+
+        Values no key has map to an empty list. The index is built the first
+        time it is used and kept up to date from then on.
+
+        """
+        if self._reverse is None:
+            self._build_reverse()
+        return _ReverseView(self._reverse)
+
+    def _build_reverse(self):
+        reverse = collections.defaultdict(list)
+        for key, value in self._dict.iteritems():
+            reverse[value].append(key)
+        self._reverse = reverse
+
+    def _update_reverse(self, key, old, new):
+        """Move key from the keys of old to those of new in the reverse index.
+
+        Either value can be _MISSING.
+
+        """
+        reverse = self._reverse
+        if old is not _MISSING:
+            keys = reverse[old]
+            keys.remove(key)
+            if not keys:
+                del reverse[old]
+        if new is not _MISSING:
+            reverse[new].append(key)
+
+    @property
+    def bloom_filter(self):
+        """A BloomFilter of the keys.
+
+        It is built the first time it is used and whenever it has had more
+        keys added than it was sized for. Keys stay in it when they are
+        deleted. Filters are not applied.
+
+        """
+        if self._bloom_filter is None or self._bloom_filter.full:
+            self._bloom_filter = BloomFilter(max(len(self), 1024) * 2, 
+                                             self.iterkeys())
+        return self._bloom_filter
+
+    def has_prefix(self, prefix):
+        """Whether any key starts with or is equal to prefix.
+
+        Filters are not applied.
+
+        """
+        return (not prefix or prefix in self._prefixes or 
+                prefix in self._dict)
 
     def iterkeys(self):
         return self._dict.iterkeys()
@@ -83,6 +322,111 @@ class StenoDictionary(collections.MutableMapping):
     def iteritems(self):
         return self._dict.iteritems()
 
+    def update(self, *args, **kw):
+        """Add entries like dict.update.
+
+        Longest key listeners are called once at the end, if at all. This is
+        how loaders fill a dictionary: while there are no entry listeners and
+        no reverse index, the entries are added in one tight loop.
+
+        """
+        longest_key = self._start_batch()
+        try:
+            if len(args) == 1 and not kw and self._add_entries(args[0]):
+                return
+            collections.MutableMapping.update(self, *args, **kw)
+        finally:
+            self._end_batch(longest_key)
+
+    def _add_entries(self, entries):
+        """Add entries without going through __setitem__.
+
+        Returns False, having added nothing, if each entry has to be set on
+        its own.
+
+        """
+        if self._entry_listener_callbacks or self._reverse is not None:
+            return False
+        # Rebuilt when it is next needed.
+        self._bloom_filter = None
+        if hasattr(entries, 'iteritems'):
+            entries = entries.iteritems()
+        elif hasattr(entries, 'keys'):
+            entries = ((k, entries[k]) for k in entries.keys())
+        try:
+            self._insert_entries(entries)
+        finally:
+            # Also count what was added before an error.
+            key_lengths = self._key_lengths
+            longest_key = len(key_lengths) - 1
+            while longest_key and not key_lengths[longest_key]:
+                longest_key -= 1
+            del key_lengths[longest_key + 1:]
+            self._longest_key = longest_key
+        return True
+
+    def _insert_entries(self, entries):
+        d = self._dict
+        prefixes = self._prefixes
+        key_lengths = self._key_lengths
+        for key, value in entries:
+            if key not in d:
+                length = len(key)
+                if length >= len(key_lengths):
+                    key_lengths.extend([0] * (length + 1 - len(key_lengths)))
+                key_lengths[length] += 1
+                for i in xrange(1, length):
+                    prefixes[key[:i]] += 1
+            d[key] = value
+
+    def delete_many(self, keys):
+        """Delete the entries for keys.
+
+        Longest key listeners are called once at the end, if at all.
+
+        """
+        longest_key = self._start_batch()
+        try:
+            for key in keys:
+                del self[key]
+        finally:
+            self._end_batch(longest_key)
+
+    def clear(self):
+        self.delete_many(list(self))
+
+    def _start_batch(self):
+        if self._batching:
+            return None
+        self._batching = True
+        return self._longest_key_length
+
+    def _end_batch(self, longest_key):
+        if longest_key is None:
+            # Part of an enclosing batch.
+            return
+        self._batching = False
+        if self._longest_key_length != longest_key:
+            self._notify_longest_key()
+
+    def _add_key_length(self, length):
+        key_lengths = self._key_lengths
+        if length >= len(key_lengths):
+            key_lengths.extend([0] * (length + 1 - len(key_lengths)))
+        key_lengths[length] += 1
+        if length > self._longest_key:
+            self._longest_key = length
+
+    def _remove_key_length(self, length):
+        key_lengths = self._key_lengths
+        key_lengths[length] -= 1
+        if length == self._longest_key and not key_lengths[length]:
+            # Only lengths down to the next one in use are checked.
+            while length and not key_lengths[length]:
+                length -= 1
+            del key_lengths[length + 1:]
+            self._longest_key = length
+
     @property
     def _longest_key(self):
         return self._longest_key_length
@@ -92,8 +436,12 @@ class StenoDictionary(collections.MutableMapping):
         if longest_key == self._longest_key_length:
             return
         self._longest_key_length = longest_key
+        if not self._batching:
+            self._notify_longest_key()
+
+    def _notify_longest_key(self):
         for callback in self._longest_listener_callbacks:
-            callback(longest_key)
+            callback(self._longest_key_length)
 
     def add_longest_key_listener(self, callback):
         self._longest_listener_callbacks.add(callback)
@@ -101,55 +449,717 @@ class StenoDictionary(collections.MutableMapping):
     def remove_longest_key_listener(self, callback):
         self._longest_listener_callbacks.remove(callback)
 
+    def add_entry_listener(self, callback):
+        """Call callback with the key whenever an entry is set or deleted."""
+        self._entry_listener_callbacks.add(callback)
+
+    def remove_entry_listener(self, callback):
+        self._entry_listener_callbacks.remove(callback)
+
     def add_filter(self, f):
         self.filters.append(f)
         
     def remove_filter(self, f):
         self.filters.remove(f)
     
+    def lookup(self, key):
+        """Get the value for key or None if it is missing or filtered.
+
+        Unlike get, this doesn't raise and catch a KeyError on a miss.
+
+        """
+        value = self._dict.get(key)
+        if value is not None and self.filters:
+            if self.filters.filtered(key, value):
+                return None
+        return value
+
     def raw_get(self, key, default):
         """Bypass filters."""
         return self._dict.get(key, default)
 
+    def raw_copy(self):
+        """A plain dict of all the entries, bypassing filters."""
+        return self._dict.copy()
+
+
+class _ReverseView(object):
+    """A read only view of a reverse index.
+
+    unpack, if given, turns the keys of the index into the keys returned.
+
+    """
+
+    def __init__(self, reverse, unpack=None):
+        self._reverse = reverse
+        self._unpack = unpack
+
+    def __getitem__(self, value):
+        return self.get(value, [])
+
+    def get(self, value, default=None):
+        keys = self._reverse.get(value)
+        if keys is None:
+            return default
+        if self._unpack is None:
+            return list(keys)
+        return [self._unpack(k) for k in keys]
+
+    def __contains__(self, value):
+        return value in self._reverse
+
+
+class StrokeTable(object):
+    """Numbers strokes and interns translations for compact dictionaries.
+
+    A key is packed into one integer holding the number of each of its strokes
+    in STROKE_BITS bits, the first stroke in the lowest bits. Strokes are
+    numbered from 1 so the length of a key is implied by its packed value.
+    The table only grows.
+
+    """
+    def __init__(self):
+        self._numbers = {}
+        self._strokes = [None]
+        self._values = {}
+        # Guards adding strokes, which can happen in several loading threads.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """The number of strokes in the table."""
+        return len(self._strokes) - 1
+
+    def _add(self, stroke):
+        with self._lock:
+            number = self._numbers.get(stroke)
+            if number is None:
+                number = len(self._strokes)
+                if number > STROKE_MASK:
+                    raise ValueError('Too many different strokes')
+                stroke = self.intern(stroke)
+                self._strokes.append(stroke)
+                self._numbers[stroke] = number
+            return number
+
+    def pack(self, key):
+        """Pack a key, numbering any strokes that are new."""
+        numbers = self._numbers
+        packed = 0
+        shift = 0
+        for stroke in key:
+            number = numbers.get(stroke)
+            if number is None:
+                number = self._add(stroke)
+            packed |= number << shift
+            shift += STROKE_BITS
+        return packed
+
+    def find(self, key):
+        """Pack a key or return None if it has a stroke that is not numbered."""
+        numbers = self._numbers
+        packed = 0
+        shift = 0
+        for stroke in key:
+            number = numbers.get(stroke)
+            if number is None:
+                return None
+            packed |= number << shift
+            shift += STROKE_BITS
+        return packed
+
+    def unpack(self, packed):
+        """Get the key, a tuple of strokes, back from its packed form."""
+        strokes = self._strokes
+        key = []
+        while packed:
+            key.append(strokes[packed & STROKE_MASK])
+            packed >>= STROKE_BITS
+        return tuple(key)
+
+    def intern(self, value):
+        """Return the one stored copy of a translation equal to value.
+
+        ASCII text is stored as a str, which is a quarter of the size.
+
+        """
+        if isinstance(value, unicode):
+            try:
+                value = value.encode('ascii')
+            except UnicodeEncodeError:
+                pass
+        return self._values.setdefault(value, value)
+
+
+# All compact dictionaries share one table so strokes and translations are
+# stored once however many dictionaries have them.
+stroke_table = StrokeTable()
+
+
+class CompactStenoDictionary(StenoDictionary):
+    """A StenoDictionary that uses less memory.
+
+    Keys are stored packed into integers by the shared stroke_table and values
+    are interned in it, so strokes and translations that appear in many
+    entries or dictionaries are stored once. Keys are unpacked on the way
+    out, which makes iterating and looking up a little slower.
+
+    """
+    def __init__(self, *args, **kw):
+        self._table = stroke_table
+        StenoDictionary.__init__(self, *args, **kw)
+
+    @property
+    def reverse(self):
+        if self._reverse is None:
+            self._build_reverse()
+        return _ReverseView(self._reverse, self._table.unpack)
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def _filtered(self, packed, value):
+        if self.filters:
+            return self.filters.filtered(packed, value, self._table.unpack)
+        return False
+
+    def __getitem__(self, key):
+        packed = self._table.find(key)
+        if packed not in self._dict:
+            raise KeyError(key)
+        value = self._dict[packed]
+        if self._filtered(packed, value):
+            raise KeyError('(%s, %s) is filtered' % (str(key), str(value)))
+        return value
+
+    def __setitem__(self, key, value):
+        packed = self._table.pack(key)
+        value = self._table.intern(value)
+        old = self._dict.get(packed, _MISSING)
+        if old is _MISSING:
+            self._add_key_length(len(key))
+            prefixes = self._prefixes
+            for i in xrange(1, len(key)):
+                prefixes[packed & ((1 << STROKE_BITS * i) - 1)] += 1
+        self._dict[packed] = value
+        if self._bloom_filter is not None:
+            self._bloom_filter.add(key)
+        if self._reverse is not None:
+            self._update_reverse(packed, old, value)
+        for callback in self._entry_listener_callbacks:
+            callback(key)
+
+    def __delitem__(self, key):
+        packed = self._table.find(key)
+        if packed not in self._dict:
+            raise KeyError(key)
+        value = self._dict.pop(packed)
+        if self._reverse is not None:
+            self._update_reverse(packed, value, _MISSING)
+        prefixes = self._prefixes
+        for i in xrange(1, len(key)):
+            prefix = packed & ((1 << STROKE_BITS * i) - 1)
+            count = prefixes[prefix] - 1
+            if count:
+                prefixes[prefix] = count
+            else:
+                del prefixes[prefix]
+        for callback in self._entry_listener_callbacks:
+            callback(key)
+        self._remove_key_length(len(key))
+
+    def __contains__(self, key):
+        packed = self._table.find(key)
+        if packed not in self._dict:
+            return False
+        return not self._filtered(packed, self._dict[packed])
+
+    def _insert_entries(self, entries):
+        d = self._dict
+        prefixes = self._prefixes
+        key_lengths = self._key_lengths
+        pack = self._table.pack
+        intern = self._table.intern
+        for key, value in entries:
+            packed = pack(key)
+            if packed not in d:
+                length = len(key)
+                if length >= len(key_lengths):
+                    key_lengths.extend([0] * (length + 1 - len(key_lengths)))
+                key_lengths[length] += 1
+                for i in xrange(1, length):
+                    prefixes[packed & ((1 << STROKE_BITS * i) - 1)] += 1
+            d[packed] = intern(value)
+
+    def has_prefix(self, prefix):
+        if not prefix:
+            return True
+        packed = self._table.find(prefix)
+        return packed in self._prefixes or packed in self._dict
+
+    def iterkeys(self):
+        unpack = self._table.unpack
+        return (unpack(k) for k in self._dict)
+
+    def iteritems(self):
+        unpack = self._table.unpack
+        return ((unpack(k), v) for k, v in self._dict.iteritems())
+
+    def iterpacked(self):
+        """Iterate over the entries with their keys still packed."""
+        return self._dict.iteritems()
+
+    def raw_get_packed(self, packed):
+        """Like raw_get but with a packed key and None as the default."""
+        return self._dict.get(packed)
+
+    def lookup(self, key):
+        packed = self._table.find(key)
+        value = self._dict.get(packed)
+        if value is not None and self._filtered(packed, value):
+            return None
+        return value
+
+    def raw_get(self, key, default):
+        return self._dict.get(self._table.find(key), default)
+
+    def raw_copy(self):
+        # Copy the items first so entries can be set while they are unpacked.
+        unpack = self._table.unpack
+        return dict((unpack(k), v) for k, v in self._dict.items())
+
+
+def normalize_translation(translation):
+    """The form of a translation that reverse lookups match on.
+
+    Case is ignored and runs of whitespace count as one space.
+
+    """
+    return u' '.join(translation.split()).lower()
+
+
+def _stroke_order(key):
+    return len(key), key
+
+
+class TranslationIndex(object):
+    """Maps normalized translations to the keys that produce them.
+
+    Only the entry that wins for each key is indexed, so keys shadowed by a
+    dictionary with higher precedence are not found. The normalized
+    translations are also kept sorted so those starting with some text can be
+    found with a binary search.
+
+    """
+    def __init__(self, dicts):
+        # Maps each key to the normalized translation it is indexed under.
+        self._keys = {}
+        # Maps each normalized translation to its keys.
+        self._translations = {}
+        self._sorted = []
+        winners = {}
+        # Go from lowest to highest precedence so winners overwrite.
+        for d in reversed(dicts):
+            winners.update((k, v) for k, v in d.iteritems() if v)
+        translations = self._translations
+        for key, value in winners.iteritems():
+            text = normalize_translation(value)
+            self._keys[key] = text
+            keys = translations.get(text)
+            if keys is None:
+                translations[text] = [key]
+            else:
+                keys.append(key)
+        self._sorted = sorted(translations)
+
+    def update(self, key, value):
+        """Index key under value, or drop it if value is None."""
+        text = self._keys.pop(key, None)
+        if text is not None:
+            keys = self._translations[text]
+            keys.remove(key)
+            if not keys:
+                del self._translations[text]
+                del self._sorted[bisect.bisect_left(self._sorted, text)]
+        if value:
+            text = normalize_translation(value)
+            self._keys[key] = text
+            keys = self._translations.get(text)
+            if keys is None:
+                self._translations[text] = [key]
+                bisect.insort(self._sorted, text)
+            else:
+                keys.append(key)
+
+    def lookup(self, translation):
+        """The keys for translation, fewest strokes first."""
+        keys = self._translations.get(normalize_translation(translation), ())
+        return sorted(keys, key=_stroke_order)
+
+    def prefix_lookup(self, prefix, limit=None):
+        """The normalized translations that start with prefix and their keys.
+
+        Returns a list of (translation, keys) pairs in the order of the
+        translations, with at most limit pairs if it is given.
+
+        """
+        prefix = normalize_translation(prefix)
+        matches = []
+        translations = self._sorted
+        i = bisect.bisect_left(translations, prefix)
+        while i < len(translations) and translations[i].startswith(prefix):
+            if limit is not None and len(matches) >= limit:
+                break
+            text = translations[i]
+            matches.append((text, sorted(self._translations[text], 
+                                         key=_stroke_order)))
+            i += 1
+        return matches
+
 
 class StenoDictionaryCollection(object):
+    """A stack of dictionaries where earlier dictionaries take precedence.
+
+    With the merged index enabled, the collection keeps a map from each key to
+    the dictionary that wins for it so a lookup is two hash probes no matter
+    how many dictionaries are stacked. It also counts the prefixes of its keys
+    so has_prefix is one hash probe. The index is updated as entries change
+    in the dictionaries. When all the dictionaries are compact the index is
+    keyed by packed keys too.
+
+    The TranslationIndex for reverse lookups is built on first use or, with
+    build_translation_index, in the background.
+
+    An overlay is a small dictionary, saved on its own, that sits above all
+    the others and that new entries go to. The dictionaries under it are then
+    only changed by merge_overlay.
+
+    """
     def __init__(self):
         self.dicts = []
-        self.filters = []
+        # The dictionaries given to set_dicts, without the overlay.
+        self._base_dicts = []
+        self.overlay = None
+        self.filters = _FilterList()
         self.longest_key = 0
         self.longest_key_callbacks = set()
+        # Maps a key to the dictionary it is found in or None if disabled.
+        self._merged = None
+        # Maps each non-empty prefix of a key of the merged index, the key
+        # itself included, to the number of keys that start with it.
+        self._merged_prefixes = None
+        # The table that packs the keys of the merged index, if they are.
+        self._merged_table = None
+        # The TranslationIndex, once it is built.
+        self._translation_index = None
+        # The keys changed while the TranslationIndex is built, or None.
+        self._translation_changes = None
+        # Identifies the current build so one for old dictionaries is dropped.
+        self._translation_build = None
+        # The thread building the TranslationIndex in the background, if any.
+        self._translation_thread = None
+        # Guards handing the changes over to a finished build.
+        self._translation_lock = threading.Lock()
+        # Whether the dictionaries have the translation entry listener.
+        self._translation_listening = False
+        # The union of the Bloom filters of the dictionaries if enabled.
+        self._bloom_filter = None
 
     def set_dicts(self, dicts):
         for d in self.dicts:
             d.remove_longest_key_listener(self._longest_key_listener)
+            if self._merged is not None:
+                d.remove_entry_listener(self._entry_listener)
+            if self._translation_listening:
+                d.remove_entry_listener(self._translation_entry_listener)
+            if self._bloom_filter is not None:
+                d.remove_entry_listener(self._bloom_entry_listener)
+        with self._translation_lock:
+            self._translation_index = None
+            self._translation_changes = None
+            self._translation_build = None
+        self._translation_thread = None
+        self._translation_listening = False
+        self._base_dicts = dicts[:]
         self.dicts = dicts[:]
         self.dicts.reverse()
-        for d in dicts:
+        if self.overlay is not None:
+            self.dicts.insert(0, self.overlay)
+        for d in self.dicts:
             d.add_longest_key_listener(self._longest_key_listener)
+        if self._merged is not None:
+            self._build_merged_index()
+        if self._bloom_filter is not None:
+            self._build_bloom_filter()
         self._longest_key_listener()
 
-    def lookup(self, key):
+    def set_overlay(self, d):
+        """Put d above the other dictionaries and send new entries to it.
+
+        None removes the overlay.
+
+        """
+        self.overlay = d
+        self.set_dicts(self._base_dicts)
+
+    def merge_overlay(self):
+        """Move the entries of the overlay into the dictionary under it.
+
+        Both dictionaries are saved.
+
+        """
+        if self.overlay is None or not self._base_dicts:
+            return
+        target = self.dicts[1]
+        entries = self.overlay.raw_copy()
+        # Add them below before taking them out above so they are never
+        # missing from the collection.
+        target.update(entries)
+        self.overlay.delete_many(list(entries))
+        for d in (target, self.overlay):
+            if d.save is not None:
+                d.save()
+
+    def enable_merged_index(self, b):
+        """Turn the merged lookup index on or off."""
+        if b == (self._merged is not None):
+            return
+        if b:
+            self._build_merged_index()
+        else:
+            for d in self.dicts:
+                d.remove_entry_listener(self._entry_listener)
+            self._merged = None
+            self._merged_prefixes = None
+
+    def enable_bloom_filter(self, b):
+        """Turn the Bloom filter that answers most misses on or off.
+
+        Without the merged index, a key that is in none of the dictionaries
+        costs a lookup in each of them. The filter turns most of those away
+        with one check.
+
+        """
+        if b == (self._bloom_filter is not None):
+            return
+        if b:
+            self._build_bloom_filter()
+        else:
+            for d in self.dicts:
+                d.remove_entry_listener(self._bloom_entry_listener)
+            self._bloom_filter = None
+
+    def _build_bloom_filter(self):
+        for d in self.dicts:
+            d.add_entry_listener(self._bloom_entry_listener)
+        self._bloom_filter = BloomFilter.union(d.bloom_filter 
+                                               for d in self.dicts)
+
+    def _bloom_entry_listener(self, key):
+        # A deleted key is left in the filter, which is still correct.
+        self._bloom_filter.add(key)
+        if self._bloom_filter.full:
+            self._build_bloom_filter()
+
+    def _build_merged_index(self):
+        merged = {}
+        compact = all(isinstance(d, CompactStenoDictionary) 
+                      for d in self.dicts)
+        self._merged_table = stroke_table if compact else None
+        # Go from lowest to highest precedence so winners overwrite.
+        for d in reversed(self.dicts):
+            items = d.iterpacked() if compact else d.iteritems()
+            merged.update((k, d) for k, v in items if v)
+            d.add_entry_listener(self._entry_listener)
+        self._merged = merged
+        self._merged_prefixes = collections.defaultdict(int)
+        for k in merged:
+            self._count_prefixes(k, 1)
+
+    def _merged_key(self, key):
+        if self._merged_table is None:
+            return key
+        return self._merged_table.find(key)
+
+    def _count_prefixes(self, merged_key, n):
+        """Add n to the counts of the prefixes of a key of the merged index."""
+        prefixes = self._merged_prefixes
+        if self._merged_table is None:
+            prefixes_of_key = [merged_key[:i] 
+                               for i in xrange(1, len(merged_key) + 1)]
+        else:
+            prefixes_of_key = []
+            bits = STROKE_BITS
+            while True:
+                prefix = merged_key & ((1 << bits) - 1)
+                prefixes_of_key.append(prefix)
+                if prefix == merged_key:
+                    break
+                bits += STROKE_BITS
+        for prefix in prefixes_of_key:
+            count = prefixes[prefix] + n
+            if count:
+                prefixes[prefix] = count
+            else:
+                del prefixes[prefix]
+
+    def _entry_listener(self, key):
+        merged = self._merged
+        merged_key = self._merged_key(key)
+        for d in self.dicts:
+            value = d.raw_get(key, None)
+            if value:
+                if merged_key not in merged:
+                    self._count_prefixes(merged_key, 1)
+                merged[merged_key] = d
+                return
+        if merged.pop(merged_key, None) is not None:
+            self._count_prefixes(merged_key, -1)
+
+    def _lookup(self, key):
+        bloom_filter = self._bloom_filter
+        if bloom_filter is not None and key not in bloom_filter:
+            return None
+        merged = self._merged
+        if merged is not None:
+            table = self._merged_table
+            if table is None:
+                d = merged.get(key)
+                if d is None:
+                    return None
+                value = d.raw_get(key, None)
+            else:
+                packed = table.find(key)
+                d = merged.get(packed)
+                if d is None:
+                    return None
+                value = d.raw_get_packed(packed)
+            # Filters on the winning dictionary may expose a lower entry.
+            if not d.filters:
+                return value
         for d in self.dicts:
-            value = d.get(key, None)
+            value = d.lookup(key)
             if value:
-                for f in self.filters:
-                    if f(key, value):
-                        return None
                 return value
 
+    def lookup(self, key):
+        value = self._lookup(key)
+        if value:
+            if self.filters and self.filters.filtered(key, value):
+                return None
+            return value
+
     def raw_lookup(self, key):
+        return self._lookup(key)
+
+    def has_prefix(self, prefix):
+        """Whether any dictionary has a key that starts with prefix.
+
+        With the merged index enabled, keys with empty translations are not
+        counted since they are never looked up.
+
+        """
+        if not prefix:
+            return True
+        prefixes = self._merged_prefixes
+        if prefixes is not None:
+            return self._merged_key(prefix) in prefixes
+        for d in self.dicts:
+            if d.has_prefix(prefix):
+                return True
+        return False
+
+    @property
+    def translation_index(self):
+        """The TranslationIndex of the dictionaries.
+
+        It is built on first use. A build in the background is waited for.
+
+        """
+        thread = self._translation_thread
+        if thread is not None:
+            thread.join()
+            self._translation_thread = None
+        if self._translation_index is None:
+            self.build_translation_index()
+        return self._translation_index
+
+    def build_translation_index(self, background=False):
+        """Build the TranslationIndex now or in a background thread.
+
+        Entries that change while it is built in the background are indexed
+        when it is done.
+
+        """
+        if (self._translation_index is not None or 
+            self._translation_changes is not None):
+            return
+        if not self._translation_listening:
+            for d in self.dicts:
+                d.add_entry_listener(self._translation_entry_listener)
+            self._translation_listening = True
+        self._translation_changes = set()
+        build = self._translation_build = object()
+        dicts = self.dicts[:]
+        if background:
+            self._translation_thread = threading.Thread(
+                target=self._index_translations, args=(build, dicts, True))
+            self._translation_thread.daemon = True
+            self._translation_thread.start()
+        else:
+            self._index_translations(build, dicts, False)
+
+    def _index_translations(self, build, dicts, copy):
+        index = None
+        try:
+            if copy:
+                # Copies can't change while they are indexed.
+                dicts = [d.raw_copy() for d in dicts]
+            index = TranslationIndex(dicts)
+        finally:
+            with self._translation_lock:
+                if build is self._translation_build:
+                    if index is not None:
+                        for key in self._translation_changes:
+                            index.update(key, self._winning_value(key))
+                        self._translation_index = index
+                    # If it failed another build can start.
+                    self._translation_changes = None
+
+    def _translation_entry_listener(self, key):
+        with self._translation_lock:
+            changes = self._translation_changes
+            if changes is not None:
+                changes.add(key)
+                return
+        if self._translation_index is not None:
+            self._translation_index.update(key, self._winning_value(key))
+
+    def _winning_value(self, key):
         for d in self.dicts:
-            value = d.get(key, None)
+            value = d.raw_get(key, None)
             if value:
                 return value
+        return None
 
     def reverse_lookup(self, value):
-        for d in self.dicts:
-            key = d.reverse.get(value, None)
-            if key:
-                return key
+        """All the keys that translate to value, fewest strokes first.
+
+        Translations are matched ignoring case and extra whitespace, and keys
+        whose entries are shadowed by a higher dictionary are left out.
+
+        """
+        return self.translation_index.lookup(value)
+
+    def reverse_prefix_lookup(self, prefix, limit=None):
+        """The translations that start with prefix and the keys for them.
+
+        See TranslationIndex.prefix_lookup.
+
+        """
+        return self.translation_index.prefix_lookup(prefix, limit)
 
     def set(self, key, value):
+        """Set an entry in the overlay or else the highest dictionary."""
         if self.dicts:
             self.dicts[0][key] = value
 
@@ -157,6 +1167,28 @@ class StenoDictionaryCollection(object):
         if self.dicts:
             self.dicts[0].save()
 
+    def flush(self):
+        """Finish any saves that are still pending.
+
+        Every dictionary is flushed even if some fail. Each failure is logged
+        and the first one is raised at the end.
+
+        """
+        error = None
+        for d in self.dicts:
+            flush = getattr(d.save, 'flush', None)
+            if not flush:
+                continue
+            try:
+                flush()
+            except Exception as e:
+                logging.getLogger(LOGGER_NAME).exception(
+                    'Saving %s failed', getattr(d.save, 'filename', d))
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
     def add_filter(self, f):
         self.filters.append(f)
 
@@ -170,7 +1202,7 @@ class StenoDictionaryCollection(object):
         self.longest_key_callbacks.remove(callback)
     
     def _longest_key_listener(self, ignored=None):
-        new_longest_key = max(d.longest_key for d in self.dicts)
+        new_longest_key = max([d.longest_key for d in self.dicts] or [0])
         if new_longest_key != self.longest_key:
             self.longest_key = new_longest_key
             for c in self.longest_key_callbacks:
@@ -0,0 +1,123 @@
+# Copyright (c) 2013 Hesky Fisher
+# See LICENSE.txt for details.
+
+"""Unit tests for batch.py."""
+
+from cStringIO import StringIO
+import logging
+import unittest
+from mock import patch
+from plover.batch import (translate_batch, read_stroke_log, is_safe_cut,
+                          _TextOutput)
+from plover.formatting import Formatter
+from plover.logger import LOGGER_NAME
+from plover.steno import Stroke
+from plover.steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from plover.translation import Translator
+
+
+def strokes(s):
+    return [Stroke(keys.split('.')) for keys in s.split()]
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        d = StenoDictionary()
+        d[('S',)] = 'is'
+        d[('T',)] = 'it'
+        d[('S', 'T')] = 'first'
+        d[('P',)] = '{-|}'
+        d[('W',)] = '{^ing}'
+        d[('H', 'R')] = 'hello'
+        self.dictionary = StenoDictionaryCollection()
+        self.dictionary.set_dicts([d])
+
+    def translate_live(self, stroke_list, undo_length):
+        translator = Translator()
+        translator.set_dictionary(self.dictionary)
+        translator.set_min_undo_length(undo_length)
+        formatter = Formatter()
+        output = _TextOutput()
+        formatter.set_output(output)
+        translator.add_listener(formatter.format)
+        for stroke in stroke_list:
+            translator.translate(stroke)
+        return output.text()
+
+    def test_same_as_translator(self):
+        cases = (
+            'S- T- -T H- R- H-',
+            'S- -T *',
+            'S- P- * T- * * P- S-',
+            'T- S- W- * * * * * H- R- -T',
+            'S- T- H- R- * * * * * * * * *',
+        )
+        for case in cases:
+            stroke_list = strokes(case)
+            for undo_length in (0, 2, 10):
+                result = translate_batch(stroke_list, self.dictionary,
+                                         undo_length)
+                self.assertEqual(result.text,
+                                 self.translate_live(stroke_list, undo_length))
+                self.assertEqual(result.stroke_count, len(stroke_list))
+
+    def test_result(self):
+        result = translate_batch(strokes('S- T- -T W- *'), self.dictionary)
+        self.assertEqual([t.rtfcre for t in result.translations],
+                         [('S', 'T'), ('-T',)])
+        self.assertEqual(result.text, u' first -T')
+        self.assertGreater(result.strokes_per_second, 0)
+
+    def test_stroke_log(self):
+        log = StringIO('2013-01-01 10:00:00,000 Stroke(S- -T)\n'
+                       '2013-01-01 10:00:01,000 Translation(...)\n'
+                       '2013-01-01 10:00:02,000 Stroke(T- *)\n')
+        self.assertEqual(list(read_stroke_log(log)),
+                         [Stroke(['S-', '-T']), Stroke(['T-', '*'])])
+        log.seek(0)
+        result = translate_batch(log, self.dictionary)
+        self.assertEqual(result.stroke_count, 2)
+        self.assertEqual(result.text, u' S-T T*')
+
+    def test_safe_cut(self):
+        stroke_list = strokes('S- -T H- R- -T S- T-.-S')
+        self.assertEqual([i for i in range(len(stroke_list) + 1)
+                          if is_safe_cut(stroke_list, i, self.dictionary)],
+                         [0, 1, 2, 4, 5, 7])
+
+    def test_parallel(self):
+        cases = (
+            'S- T- -T H- R- H- P- S- W- T- ' * 20,
+            'S- P- * T- * * P- S- H- * * * * * * * R- W- ' * 20,
+        )
+        for case in cases:
+            stroke_list = strokes(case)
+            for undo_length in (0, 10):
+                expected = translate_batch(stroke_list, self.dictionary,
+                                           undo_length)
+                with patch('plover.batch.PARALLEL_CHUNK_SIZE', 7):
+                    result = translate_batch(stroke_list, self.dictionary,
+                                             undo_length, processes=2)
+                self.assertEqual(result.text, expected.text)
+                self.assertEqual(result.translations, expected.translations)
+                self.assertEqual(result.stroke_count, len(stroke_list))
+
+    def test_parallel_without_fork(self):
+        stroke_list = strokes('S- T- -T H- R- H- P- S- W- T- ' * 20)
+        expected = translate_batch(stroke_list, self.dictionary)
+        logger = logging.getLogger(LOGGER_NAME)
+        with patch('plover.batch.CAN_FORK', False), \
+             patch('plover.batch.multiprocessing.Pool') as pool, \
+             patch.object(logger, 'warning') as warning:
+            result = translate_batch(iter(stroke_list), self.dictionary,
+                                     processes=2)
+        self.assertFalse(pool.called)
+        self.assertEqual(warning.call_count, 1)
+        self.assertEqual(result.text, expected.text)
+        self.assertEqual(result.translations, expected.translations)
+        self.assertEqual(result.stroke_count, len(stroke_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -72,6 +72,21 @@ class ConfigTestCase(unittest.TestCase):
         ('serial_config_frame_y', config.SERIAL_CONFIG_FRAME_SECTION, 
          config.SERIAL_CONFIG_FRAME_Y_OPTION, 
          config.DEFAULT_SERIAL_CONFIG_FRAME_Y, 1, 2, 3),
+        ('dictionary_load_processes', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_LOAD_PROCESSES_OPTION, 
+         config.DEFAULT_DICTIONARY_LOAD_PROCESSES, 1, 2, 3),
+        ('reload_dictionaries', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_RELOAD_OPTION, config.DEFAULT_DICTIONARY_RELOAD, 
+         True, False, True),
+        ('progressive_loading', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_PROGRESSIVE_OPTION, 
+         config.DEFAULT_DICTIONARY_PROGRESSIVE, True, False, True),
+        ('compact_dictionaries', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_COMPACT_OPTION, config.DEFAULT_DICTIONARY_COMPACT, 
+         True, False, True),
+        ('dictionary_overlay_file', config.DICTIONARY_LOADING_SECTION, 
+         config.DICTIONARY_OVERLAY_OPTION, config.DEFAULT_DICTIONARY_OVERLAY, 
+         'o1', 'overlay.json', 'user.rtf'),
         )
 
         for case in cases:
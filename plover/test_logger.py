@@ -77,5 +77,11 @@ class LoggerTestCase(unittest.TestCase):
         self.logger.log_translation(['e'], ['f'], None)
         self.assertEqual(FakeHandler.get_output(), {'fn': ['*c', 'd']})
 
+    def test_log_error(self):
+        self.logger.log_error('a')
+        self.logger.set_filename('fn')
+        self.logger.log_error('b')
+        self.assertEqual(FakeHandler.get_output(), {'fn': ['b']})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,6 +3,8 @@
 
 """Unit tests for steno.py."""
 
+import copy
+import pickle
 import unittest
 from steno import normalize_steno, Stroke
 
@@ -29,6 +31,34 @@ class StenoTestCase(unittest.TestCase):
         self.assertEqual(Stroke(['T-', 'S-']).rtfcre, 'ST')
         self.assertEqual(Stroke(['-P', '-P']).rtfcre, '-P')
         self.assertEqual(Stroke(['-P', 'X-']).rtfcre, 'X-P')
+        self.assertEqual(Stroke(['#', 'S-', '-T']).rtfcre, '1-9')
+        self.assertEqual(Stroke(['#', 'S-', '-T']).steno_keys, ('1-', '-9'))
+        self.assertEqual(Stroke(['#', 'S-', 'A-']).rtfcre, '15')
+        self.assertEqual(Stroke(['#', '-Z']).rtfcre, '#-Z')
+        self.assertEqual(Stroke(['A-', '-E']).rtfcre, 'AE')
+        self.assertTrue(Stroke(['*']).is_correction)
+        self.assertFalse(Stroke(['*', 'S-']).is_correction)
+
+    def test_interning(self):
+        s = Stroke(['S-', 'T-'])
+        self.assertIs(Stroke(['T-', 'S-', 'T-']), s)
+        self.assertIs(copy.copy(s), s)
+        self.assertIs(copy.deepcopy(s), s)
+        self.assertIs(pickle.loads(pickle.dumps(s)), s)
+        self.assertEqual(s, Stroke(['T-', 'S-']))
+        self.assertNotEqual(s, Stroke(['S-']))
+        self.assertEqual(len(set([s, Stroke(['S-', 'T-'])])), 1)
+        # Number keys are the same as the number bar and the original key.
+        self.assertIs(Stroke(['1-', '-9']), Stroke(['#', 'S-', '-T']))
+        n = Stroke(['#', 'S-', '-T'])
+        self.assertIs(pickle.loads(pickle.dumps(n)), n)
+        # Non-standard keys are interned too.
+        x = Stroke(['-P', 'X-'])
+        self.assertIs(Stroke(['X-', '-P']), x)
+        self.assertIs(pickle.loads(pickle.dumps(x)), x)
+        self.assertIsNot(x, Stroke(['-P']))
+        with self.assertRaises(AttributeError):
+            s.rtfcre = 'T'
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,8 +3,11 @@
 
 """Unit tests for steno_dictionary.py."""
 
+import threading
 import unittest
-from steno_dictionary import StenoDictionary, StenoDictionaryCollection
+from steno_dictionary import (StenoDictionary, StenoDictionaryCollection, 
+                              CompactStenoDictionary, StrokeTable, BloomFilter,
+                              ValueFilter)
 
 class StenoDictionaryTestCase(unittest.TestCase):
 
@@ -45,6 +48,93 @@ class StenoDictionaryTestCase(unittest.TestCase):
         self.assertEqual(StenoDictionary([('a', 'b')]).items(), [('a', 'b')])
         self.assertEqual(StenoDictionary(a='b').items(), [('a', 'b')])
         
+    def test_bulk_changes(self):
+        for cls in (StenoDictionary, CompactStenoDictionary):
+            notifications = []
+            d = cls()
+            d.add_longest_key_listener(lambda n: notifications.append(n))
+            d.update([(('S',) * n, 'a') for n in (1, 3, 2, 5)])
+            self.assertEqual(d.longest_key, 5)
+            self.assertEqual(notifications, [5])
+            d.update({('S',): 'b'})
+            self.assertEqual(notifications, [5])
+            self.assertEqual(d[('S',)], 'b')
+            self.assertTrue(d.has_prefix(('S',) * 4))
+            self.assertFalse(d.has_prefix(('S',) * 6))
+            # The reverse index is kept up to date once it is built.
+            self.assertEqual(d.reverse['b'], [('S',)])
+            d.update(((('T',), 'b'),))
+            self.assertEqual(sorted(d.reverse['b']), [('S',), ('T',)])
+            del d[('T',)]
+            d.delete_many([('S',) * 5, ('S',) * 3])
+            self.assertEqual(d.longest_key, 2)
+            self.assertEqual(notifications, [5, 2])
+            with self.assertRaises(KeyError):
+                d.delete_many([('S',) * 2, ('T',)])
+            # Listeners hear about the entries deleted before the error.
+            self.assertEqual(d.longest_key, 1)
+            self.assertEqual(notifications, [5, 2, 1])
+            d.clear()
+            self.assertEqual(d.longest_key, 0)
+            self.assertEqual(notifications, [5, 2, 1, 0])
+
+    def test_lookup(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T',)] = 'b'
+        self.assertEqual(d.lookup(('S',)), 'a')
+        self.assertIsNone(d.lookup(('P',)))
+        f = lambda k, v: v == 'a'
+        d.add_filter(f)
+        self.assertIsNone(d.lookup(('S',)))
+        self.assertEqual(d.lookup(('T',)), 'b')
+        self.assertEqual(d.raw_get(('S',), None), 'a')
+        d.remove_filter(f)
+        self.assertEqual(d.lookup(('S',)), 'a')
+
+    def test_has_prefix(self):
+        d = StenoDictionary()
+        self.assertTrue(d.has_prefix(()))
+        self.assertFalse(d.has_prefix(('S',)))
+        d[('S', 'T', 'P')] = 'a'
+        d[('S', 'T')] = 'b'
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertTrue(d.has_prefix(('S', 'T', 'P')))
+        self.assertFalse(d.has_prefix(('T',)))
+        self.assertFalse(d.has_prefix(('S', 'T', 'P', 'P')))
+        d[('S', 'T')] = 'c'
+        del d[('S', 'T', 'P')]
+        self.assertTrue(d.has_prefix(('S',)))
+        self.assertTrue(d.has_prefix(('S', 'T')))
+        self.assertFalse(d.has_prefix(('S', 'T', 'P')))
+        del d[('S', 'T')]
+        self.assertFalse(d.has_prefix(('S',)))
+        
+        dc = StenoDictionaryCollection()
+        d2 = StenoDictionary()
+        d2[('W', 'T')] = 'd'
+        dc.set_dicts([d, d2])
+        self.assertTrue(dc.has_prefix(('W',)))
+        self.assertFalse(dc.has_prefix(('S',)))
+        d[('S', 'T')] = 'e'
+        self.assertTrue(dc.has_prefix(('S',)))
+        
+        # The merged index counts prefixes across all the dictionaries.
+        dc.enable_merged_index(True)
+        self.assertTrue(dc.has_prefix(()))
+        self.assertTrue(dc.has_prefix(('W',)))
+        self.assertTrue(dc.has_prefix(('S', 'T')))
+        self.assertFalse(dc.has_prefix(('T',)))
+        d2[('S', 'P', 'T')] = 'f'
+        del d[('S', 'T')]
+        self.assertTrue(dc.has_prefix(('S', 'P')))
+        self.assertFalse(dc.has_prefix(('S', 'T')))
+        del d2[('W', 'T')]
+        self.assertFalse(dc.has_prefix(('W',)))
+        dc.enable_merged_index(False)
+        self.assertTrue(dc.has_prefix(('S', 'P')))
+
     def test_dictionary_collection(self):
         dc = StenoDictionaryCollection()
         d1 = StenoDictionary()
@@ -72,9 +162,366 @@ class StenoDictionaryTestCase(unittest.TestCase):
         
         self.assertEqual(dc.reverse_lookup('c'), [('S',)])
         
+        # A filter on a dictionary exposes entries in lower dictionaries.
+        f = lambda k, v: v == 'c'
+        d2.add_filter(f)
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        d2.remove_filter(f)
+        
         dc.set(('S',), 'e')
         self.assertEqual(dc.lookup(('S',)), 'e')
         self.assertEqual(d2[('S',)], 'e')
+
+    def test_merged_index(self):
+        dc = StenoDictionaryCollection()
+        dc.enable_merged_index(True)
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T',)] = 'b'
+        d1[('P',)] = 'f'
+        d2 = StenoDictionary()
+        d2[('S',)] = 'c'
+        d2[('W',)] = 'd'
+        d2[('P',)] = ''
+        dc.set_dicts([d1, d2])
+        self.assertEqual(dc.lookup(('S',)), 'c')
+        self.assertEqual(dc.lookup(('W',)), 'd')
+        self.assertEqual(dc.lookup(('T',)), 'b')
+        # Empty translations don't hide lower entries.
+        self.assertEqual(dc.lookup(('P',)), 'f')
+        self.assertIsNone(dc.lookup(('R',)))
+        
+        del d2[('S',)]
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        d2[('S',)] = 'e'
+        self.assertEqual(dc.lookup(('S',)), 'e')
+        d1[('S',)] = 'g'
+        self.assertEqual(dc.lookup(('S',)), 'e')
+        del d1[('T',)]
+        self.assertIsNone(dc.lookup(('T',)))
+        dc.set(('R',), 'h')
+        self.assertEqual(dc.lookup(('R',)), 'h')
+        
+        f = lambda k, v: v == 'e'
+        d2.add_filter(f)
+        self.assertEqual(dc.lookup(('S',)), 'g')
+        d2.remove_filter(f)
+        dc.add_filter(f)
+        self.assertIsNone(dc.lookup(('S',)))
+        self.assertEqual(dc.raw_lookup(('S',)), 'e')
+        dc.remove_filter(f)
+        
+        dc.set_dicts([d2, d1])
+        self.assertEqual(dc.lookup(('S',)), 'g')
+        d2[('S',)] = 'i'
+        self.assertEqual(dc.lookup(('S',)), 'g')
+        
+        dc.enable_merged_index(False)
+        self.assertEqual(dc.lookup(('S',)), 'g')
+        d1[('S',)] = 'j'
+        self.assertEqual(dc.lookup(('S',)), 'j')
+        
+    def test_reverse(self):
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        d[('T',)] = 'a'
+        # The reverse index is only built when it is used.
+        self.assertIsNone(d._reverse)
+        self.assertEqual(d.reverse['a'], [('S',), ('T',)])
+        d[('P',)] = 'b'
+        d[('S',)] = 'b'
+        self.assertEqual(d.reverse['a'], [('T',)])
+        self.assertEqual(d.reverse['b'], [('P',), ('S',)])
+        del d[('T',)]
+        # Values with no keys left are dropped.
+        self.assertNotIn('a', d.reverse)
+        # Looking a value up doesn't add it.
+        self.assertEqual(d.reverse['c'], [])
+        self.assertIsNone(d.reverse.get('c'))
+        self.assertNotIn('c', d.reverse)
         
+        d = CompactStenoDictionary()
+        d[('S', 'T')] = 'a'
+        self.assertIsNone(d._reverse)
+        self.assertEqual(d.reverse['a'], [('S', 'T')])
+        del d[('S', 'T')]
+        self.assertNotIn('a', d.reverse)
+
+    def test_stroke_table(self):
+        table = StrokeTable()
+        for key in [(), ('S',), ('S', 'T', '-P'), (u'KWR', 'S')]:
+            self.assertEqual(table.unpack(table.pack(key)), key)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.find(('S', 'T')), table.pack(('S', 'T')))
+        self.assertIsNone(table.find(('S', 'W')))
+        self.assertEqual(len(table), 4)
+        self.assertIs(table.intern(u'abc'), table.intern('abc'))
+        self.assertEqual(type(table.intern(u'abc')), str)
+        self.assertEqual(table.intern(u'\xf1'), u'\xf1')
+
+    def test_compact_dictionary(self):
+        d = CompactStenoDictionary()
+        d[('S',)] = u'a'
+        d[('S', 'T')] = u'b'
+        d[('T', '-P', 'S')] = u'a'
+        self.assertEqual(len(d), 3)
+        self.assertEqual(d.longest_key, 3)
+        self.assertEqual(d[('S', 'T')], 'b')
+        self.assertEqual(d.lookup(('T', '-P', 'S')), 'a')
+        self.assertIsNone(d.lookup(('W',)))
+        self.assertEqual(d.raw_get(('W',), 'x'), 'x')
+        self.assertRaises(KeyError, lambda: d[('W',)])
+        self.assertIn(('S',), d)
+        self.assertNotIn(('S', 'W'), d)
+        self.assertEqual(sorted(d.iterkeys()), 
+                         [('S',), ('S', 'T'), ('T', '-P', 'S')])
+        self.assertEqual(d.raw_copy(), dict(d.iteritems()))
+        self.assertEqual(sorted(d.reverse['a']), [('S',), ('T', '-P', 'S')])
+        self.assertTrue(d.has_prefix(('T', '-P')))
+        self.assertFalse(d.has_prefix(('T', 'S')))
+        f = lambda k, v: k == ('S',)
+        d.add_filter(f)
+        self.assertIsNone(d.lookup(('S',)))
+        self.assertNotIn(('S',), d)
+        d.remove_filter(f)
+        del d[('T', '-P', 'S')]
+        self.assertEqual(d.longest_key, 2)
+        self.assertFalse(d.has_prefix(('T',)))
+        self.assertEqual(d.reverse['a'], [('S',)])
+        self.assertRaises(KeyError, d.__delitem__, ('T', '-P', 'S'))
+
+    def test_compact_merged_index(self):
+        dc = StenoDictionaryCollection()
+        dc.enable_merged_index(True)
+        d1 = CompactStenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T',)] = 'b'
+        d2 = CompactStenoDictionary()
+        d2[('S',)] = 'c'
+        dc.set_dicts([d1, d2])
+        self.assertEqual(dc.lookup(('S',)), 'c')
+        self.assertEqual(dc.lookup(('T',)), 'b')
+        self.assertIsNone(dc.lookup(('P', 'W')))
+        del d2[('S',)]
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        dc.set(('T', 'P'), 'd')
+        self.assertEqual(dc.lookup(('T', 'P')), 'd')
+        self.assertTrue(dc.has_prefix(('T',)))
+        self.assertTrue(dc.has_prefix(('T', 'P')))
+        self.assertFalse(dc.has_prefix(('T', 'S')))
+        self.assertFalse(dc.has_prefix(('T', 'P', 'S')))
+        self.assertFalse(dc.has_prefix(('KWR',)))
+        del d2[('T', 'P')]
+        self.assertFalse(dc.has_prefix(('T', 'P')))
+        # A compact overlay keeps the index packed.
+        overlay = CompactStenoDictionary()
+        dc.set_overlay(overlay)
+        self.assertIsNotNone(dc._merged_table)
+        dc.set(('S',), 'f')
+        self.assertEqual(overlay[('S',)], 'f')
+        self.assertEqual(dc.lookup(('S',)), 'f')
+        self.assertTrue(dc.has_prefix(('T',)))
+        dc.set_overlay(None)
+        # A mix of compact and plain dictionaries works too.
+        d3 = StenoDictionary()
+        d3[('T',)] = 'e'
+        dc.set_dicts([d1, d2, d3])
+        self.assertEqual(dc.lookup(('T',)), 'e')
+        self.assertEqual(dc.lookup(('S',)), 'a')
+
+    def test_translation_index(self):
+        dc = StenoDictionaryCollection()
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d1[('T', '-P')] = 'Hello  world'
+        d1[('W',)] = 'hello'
+        d2 = CompactStenoDictionary()
+        d2[('S',)] = 'b'
+        d2[('H', 'E', 'L')] = ' hello world'
+        dc.set_dicts([d1, d2])
+        # Case and whitespace are ignored and shorter keys come first.
+        self.assertEqual(dc.reverse_lookup('hello WORLD'), 
+                         [('T', '-P'), ('H', 'E', 'L')])
+        # Shadowed entries are not found.
+        self.assertEqual(dc.reverse_lookup('a'), [])
+        self.assertEqual(dc.reverse_prefix_lookup('Hel'), 
+                         [(u'hello', [('W',)]), 
+                          (u'hello world', [('T', '-P'), ('H', 'E', 'L')])])
+        self.assertEqual(dc.reverse_prefix_lookup('hel', 1), 
+                         [(u'hello', [('W',)])])
+        self.assertEqual(dc.reverse_prefix_lookup('x'), [])
+        # The index follows changes to the dictionaries.
+        del d2[('S',)]
+        self.assertEqual(dc.reverse_lookup('a'), [('S',)])
+        self.assertEqual(dc.reverse_lookup('b'), [])
+        d1[('W',)] = 'help'
+        self.assertEqual(dc.reverse_prefix_lookup('hel'), 
+                         [(u'hello world', [('T', '-P'), ('H', 'E', 'L')]),
+                          (u'help', [('W',)])])
+        dc.set(('S', 'T'), 'Help')
+        self.assertEqual(dc.reverse_lookup('help'), [('W',), ('S', 'T')])
+        dc.set_dicts([d1])
+        self.assertEqual(dc.reverse_lookup('hello world'), [('T', '-P')])
+
+    def test_translation_index_in_background(self):
+        copying = threading.Event()
+        resume = threading.Event()
+        class SlowDictionary(StenoDictionary):
+            def raw_copy(self):
+                copy = StenoDictionary.raw_copy(self)
+                copying.set()
+                resume.wait()
+                return copy
+        dc = StenoDictionaryCollection()
+        d = SlowDictionary()
+        d[('S',)] = 'a'
+        d[('T',)] = 'b'
+        dc.set_dicts([d])
+        dc.build_translation_index(background=True)
+        copying.wait()
+        # Changes made while the index is built are not lost.
+        d[('S',)] = 'c'
+        del d[('T',)]
+        resume.set()
+        self.assertEqual(dc.reverse_lookup('c'), [('S',)])
+        self.assertEqual(dc.reverse_lookup('a'), [])
+        self.assertEqual(dc.reverse_lookup('b'), [])
+        d[('W',)] = 'c'
+        self.assertEqual(dc.reverse_lookup('c'), [('S',), ('W',)])
+        
+        # A build for dictionaries that were replaced is dropped.
+        copying.clear()
+        resume.clear()
+        dc.set_dicts([])
+        dc.set_dicts([d])
+        dc.build_translation_index(background=True)
+        copying.wait()
+        thread = dc._translation_thread
+        dc.set_dicts([StenoDictionary()])
+        resume.set()
+        thread.join()
+        self.assertEqual(dc.reverse_lookup('c'), [])
+
+    def test_overlay(self):
+        saves = []
+        dc = StenoDictionaryCollection()
+        d1 = StenoDictionary()
+        d1[('S',)] = 'a'
+        d2 = CompactStenoDictionary()
+        d2[('S',)] = 'b'
+        d2[('T',)] = 'c'
+        d2.save = lambda: saves.append('d2')
+        overlay = StenoDictionary()
+        overlay.save = lambda: saves.append('overlay')
+        dc.set_overlay(overlay)
+        dc.set_dicts([d1, d2])
+        self.assertEqual(dc.lookup(('S',)), 'b')
+        # New entries go to the overlay and win over the others.
+        dc.set(('S',), 'd')
+        dc.set(('S', 'T'), 'e')
+        dc.save()
+        self.assertEqual(saves, ['overlay'])
+        self.assertEqual(overlay.items(), [(('S',), 'd'), (('S', 'T'), 'e')])
+        self.assertEqual(d2[('S',)], 'b')
+        self.assertEqual(dc.lookup(('S',)), 'd')
+        self.assertEqual(dc.longest_key, 2)
+        # Merging moves them into the highest dictionary under the overlay.
+        dc.merge_overlay()
+        self.assertEqual(sorted(saves), ['d2', 'overlay', 'overlay'])
+        self.assertEqual(len(overlay), 0)
+        self.assertEqual(d2[('S',)], 'd')
+        self.assertEqual(d2[('S', 'T')], 'e')
+        self.assertEqual(dc.lookup(('S', 'T')), 'e')
+        dc.set_overlay(None)
+        dc.set(('W',), 'f')
+        self.assertEqual(d2[('W',)], 'f')
+
+    def test_value_filter(self):
+        calls = []
+        def predicate(value):
+            calls.append(value)
+            return value.startswith('{')
+        for cls in (StenoDictionary, CompactStenoDictionary):
+            del calls[:]
+            f = ValueFilter(predicate)
+            d = cls()
+            d[('S',)] = 'a'
+            d[('T',)] = '{^}'
+            d.add_filter(f)
+            self.assertEqual(d.lookup(('S',)), 'a')
+            self.assertIsNone(d.lookup(('T',)))
+            self.assertNotIn(('T',), d)
+            self.assertEqual(d[('S',)], 'a')
+            self.assertEqual(calls, ['a', '{^}'])
+            # Changed entries are checked again.
+            d[('T',)] = 'b'
+            d[('S',)] = '{-|}'
+            self.assertEqual(d.lookup(('T',)), 'b')
+            self.assertIsNone(d.lookup(('S',)))
+            self.assertEqual(calls, ['a', '{^}', 'b', '{-|}'])
+            # Other filters still see the key.
+            d.add_filter(lambda k, v: k == ('T',))
+            self.assertIsNone(d.lookup(('T',)))
+            d.remove_filter(f)
+            self.assertEqual(d.lookup(('S',)), '{-|}')
+
+        dc = StenoDictionaryCollection()
+        d1 = StenoDictionary()
+        d1[('S',)] = '{^}'
+        d2 = StenoDictionary()
+        d2[('S',)] = 'a'
+        dc.set_dicts([d1, d2])
+        dc.add_filter(ValueFilter(predicate))
+        self.assertEqual(dc.lookup(('S',)), 'a')
+        # A dictionary filter changes which entry the collection finds.
+        d2.add_filter(lambda k, v: True)
+        self.assertIsNone(dc.lookup(('S',)))
+        self.assertEqual(dc.raw_lookup(('S',)), '{^}')
+
+    def test_bloom_filter(self):
+        keys = [('S', str(i)) for i in xrange(1000)]
+        f = BloomFilter(1000, keys[:500])
+        self.assertTrue(all(k in f for k in keys[:500]))
+        misses = sum(k in f for k in keys[500:])
+        self.assertLess(misses, 50)
+        self.assertFalse(f.full)
+        f2 = BloomFilter(100, keys[500:550])
+        union = BloomFilter.union([f, f2])
+        self.assertTrue(all(k in union for k in keys[:550]))
+        self.assertEqual(union.count, 550)
+        self.assertGreaterEqual(len(union), len(f))
+        f2.update(keys[550:700])
+        self.assertTrue(f2.full)
+
+    def test_collection_bloom_filter(self):
+        for cls in (StenoDictionary, CompactStenoDictionary):
+            dc = StenoDictionaryCollection()
+            d1 = cls()
+            d1[('S',)] = 'a'
+            d2 = cls()
+            d2[('T',)] = 'b'
+            dc.set_dicts([d1, d2])
+            dc.enable_bloom_filter(True)
+            self.assertEqual(dc.lookup(('S',)), 'a')
+            self.assertEqual(dc.lookup(('T',)), 'b')
+            self.assertIsNone(dc.lookup(('P',)))
+            # Entries added and deleted later are found or not.
+            d2[('P',)] = 'c'
+            self.assertEqual(dc.lookup(('P',)), 'c')
+            del d1[('S',)]
+            self.assertIsNone(dc.lookup(('S',)))
+            dc.set(('W',), 'd')
+            self.assertEqual(dc.lookup(('W',)), 'd')
+            # Enough new entries for the filters to be rebuilt.
+            for i in xrange(5000):
+                d1[('S', str(i))] = str(i)
+            self.assertTrue(all(dc.lookup(('S', str(i))) == str(i) 
+                                for i in xrange(5000)))
+            dc.set_dicts([d1])
+            self.assertIsNone(dc.lookup(('T',)))
+            self.assertEqual(dc.lookup(('S', '1')), '1')
+            dc.enable_bloom_filter(False)
+            self.assertEqual(dc.lookup(('S', '1')), '1')
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
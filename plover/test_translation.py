@@ -332,6 +332,68 @@ class TranslatorTestCase(unittest.TestCase):
         t.translate(stroke('S'))
         self.assertEqual(out.get(), '')
 
+    def test_retranslate(self):
+        output = []
+        def listener(undo, do, prev):
+            output.append((undo, do, prev))
+
+        d = StenoDictionary()
+        d[('S',)] = 'a'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([d])
+        t = Translator()
+        t.set_dictionary(dc)
+        t.set_min_undo_length(10)
+        t.translate(stroke('S'))
+        t.translate(stroke('T'))
+        t.translate(stroke('-D'))
+        t.add_listener(listener)
+
+        # Nothing changed.
+        t.retranslate()
+        self.assertEqual(output, [])
+
+        d2 = StenoDictionary()
+        d2[('T', '-D')] = 'b'
+        dc.set_dicts([d2, d])
+        t.retranslate()
+        self.assertEqual(output, [([Translation([stroke('T')], None), 
+                                    Translation([stroke('-D')], None)],
+                                   [Translation([stroke('T'), stroke('-D')], 
+                                                'b')],
+                                   Translation([stroke('S')], 'a'))])
+        self.assertEqual(t.get_state().translations, 
+                         [Translation([stroke('S')], 'a'), 
+                          Translation([stroke('T'), stroke('-D')], 'b')])
+        # The new translation can be undone.
+        del output[:]
+        t.translate(stroke('*'))
+        self.assertEqual(output, [([Translation([stroke('T'), stroke('-D')], 
+                                                'b')],
+                                   [Translation([stroke('T')], None)],
+                                   Translation([stroke('S')], 'a'))])
+
+    def test_long_undo_length(self):
+        d = StenoDictionary()
+        d[('S', 'T')] = 'a'
+        dc = StenoDictionaryCollection()
+        dc.set_dicts([d])
+        t = Translator()
+        t.set_dictionary(dc)
+        t.set_min_undo_length(2000)
+        for i in xrange(1500):
+            t.translate(stroke('S'))
+            t.translate(stroke('T'))
+        s = t.get_state()
+        self.assertEqual(len(s.translations), 1000)
+        self.assertEqual(s.translations.stroke_count, 2000)
+        self.assertEqual(s.tail, Translation([stroke('S'), stroke('T')], 'a'))
+        # Undoing each translation takes it back to its first stroke first.
+        for i in xrange(1999):
+            t.translate(stroke('*'))
+        self.assertEqual(s.translations, [Translation([stroke('S')], None)])
+        self.assertEqual(s.translations.stroke_count, 1)
+
 class StateTestCase(unittest.TestCase):
     
     def setUp(self):
@@ -419,6 +481,23 @@ class StateTestCase(unittest.TestCase):
         self.assertEquals(s.translations, [self.b, self.c])
         self.assertEqual(s.tail, self.a)
 
+    def test_history(self):
+        s = _State()
+        s.translations = [self.a, self.b]
+        h = s.translations
+        self.assertEqual(h.stroke_count, 3)
+        h.extend([self.c, self.a])
+        self.assertEqual(h.stroke_count, 7)
+        self.assertEqual(h[1:3], [self.b, self.c])
+        self.assertEqual(h[-1:], [self.a])
+        self.assertEqual(h[-2], self.c)
+        del h[2:]
+        self.assertEqual(h, [self.a, self.b])
+        self.assertEqual(h.stroke_count, 3)
+        del h[:1]
+        self.assertEqual(h, [self.b])
+        self.assertEqual(h.stroke_count, 2)
+
 class TranslateStrokeTestCase(unittest.TestCase):
 
     class CaptureOutput(object):
@@ -586,7 +665,17 @@ class TranslateStrokeTestCase(unittest.TestCase):
         self.assertEqual(lt[0].english, None)
         self.translate(stroke('K-LG'))
         self.assertTranslations(lt)
-    
+
+    def test_suffix_folding_order(self):
+        self.define('K-LG', 'looking')
+        self.define('K-LS', 'looks')
+        self.define('-G', '{^ing}')
+        self.translate(stroke('K-LGS'))
+        self.assertEqual(self.s.translations[-1].english, 'looks {^ing}')
+        self.define('-S', '{^s}')
+        self.translate(stroke('K-LGS'))
+        self.assertEqual(self.s.translations[-1].english, 'looking {^s}')
+
 
 if __name__ == '__main__':
     unittest.main()
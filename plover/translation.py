@@ -18,6 +18,7 @@ emits one or more Translation objects based on a greedy conversion algorithm.
 
 from plover.steno import Stroke
 from plover.steno_dictionary import StenoDictionaryCollection
+import collections
 import itertools
 
 class Translation(object):
@@ -120,6 +121,40 @@ class Translator(object):
         _translate_stroke(stroke, self._state, self._dictionary, self._output)
         self._resize_translations()
 
+    def retranslate(self):
+        """Translate the strokes in the undo buffer again.
+
+        This is for when the dictionary changed under strokes that were already
+        translated. Listeners get the translations that came out differently 
+        as a correction.
+
+        """
+        state = self._state
+        old = state.translations
+        new_state = _State()
+        new_state.tail = state.tail
+        ignore = lambda undo, do, prev: None
+        for t in old:
+            for stroke in t.strokes:
+                _translate_stroke(stroke, new_state, self._dictionary, ignore)
+        new = new_state.translations
+        # Keep the translations that didn't change since they hold the 
+        # formatting that was output for them.
+        i = 0
+        for old_t, new_t in itertools.izip(old, new):
+            if old_t != new_t:
+                break
+            i += 1
+        if i == len(old) and i == len(new):
+            return
+        prev = old[i - 1] if i else state.tail
+        undo = old[i:]
+        do = new[i:]
+        del old[i:]
+        self._output(undo, do, prev)
+        old.extend(do)
+        self._resize_translations()
+
     def set_dictionary(self, d):
         """Set the dictionary."""
         callback = self._dict_callback
@@ -180,20 +215,117 @@ class Translator(object):
         """Reset the sate of the translator."""
         self._state = _State()
 
+class _TranslationHistory(object):
+    """The undoable translations, oldest first.
+
+    This is a deque with a running count of the strokes in it, so adding and
+    removing translations at either end takes constant time however long the
+    history is. It can be indexed, sliced and compared like a list; slices are
+    lists.
+
+    """
+    def __init__(self, translations=()):
+        self._translations = collections.deque()
+        self.stroke_count = 0
+        self.extend(translations)
+
+    def __len__(self):
+        return len(self._translations)
+
+    def __iter__(self):
+        return iter(self._translations)
+
+    def __reversed__(self):
+        return reversed(self._translations)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self._translations[index]
+        length = len(self._translations)
+        start, stop, step = index.indices(length)
+        if step != 1:
+            return list(self._translations)[index]
+        if stop <= start:
+            return []
+        # Walk from whichever end is nearer.
+        if start >= length - stop:
+            items = list(itertools.islice(reversed(self._translations),
+                                          length - stop, length - start))
+            items.reverse()
+            return items
+        return list(itertools.islice(self._translations, start, stop))
+
+    def __delitem__(self, index):
+        length = len(self._translations)
+        if not isinstance(index, slice):
+            index = slice(index, index + 1 or None)
+        start, stop, step = index.indices(length)
+        if step == 1 and stop == length:
+            for i in xrange(max(stop - start, 0)):
+                self.pop()
+        elif step == 1 and start == 0:
+            for i in xrange(stop):
+                self.popleft()
+        else:
+            items = list(self._translations)
+            del items[index]
+            self._translations.clear()
+            self.stroke_count = 0
+            self.extend(items)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, translation):
+        self._translations.append(translation)
+        self.stroke_count += len(translation)
+
+    def extend(self, translations):
+        for t in translations:
+            self._translations.append(t)
+            self.stroke_count += len(t)
+
+    def pop(self):
+        """Remove and return the newest translation."""
+        t = self._translations.pop()
+        self.stroke_count -= len(t)
+        return t
+
+    def popleft(self):
+        """Remove and return the oldest translation."""
+        t = self._translations.popleft()
+        self.stroke_count -= len(t)
+        return t
+
 class _State(object):
     """An object representing the current state of the translator state machine.
     
     Attributes:
 
-    translations -- A list of all previous translations that are still undoable.
+    translations -- A _TranslationHistory of all previous translations that
+    are still undoable. A list can be assigned to it.
 
     tail -- The oldest translation still saved but is no longer undoable.
 
     """
     def __init__(self):
-        self.translations = []
+        self._translations = _TranslationHistory()
         self.tail = None
 
+    @property
+    def translations(self):
+        return self._translations
+
+    @translations.setter
+    def translations(self, translations):
+        self._translations = _TranslationHistory(translations)
+
     def last(self):
         """Get the most recent translation."""
         if self.translations:
@@ -201,18 +333,144 @@ class _State(object):
         return self.tail
 
     def restrict_size(self, n):
-        """Reduce the history of translations to n."""
-        stroke_count = 0
-        translation_count = 0
-        for t in reversed(self.translations):
-            stroke_count += len(t)
-            translation_count += 1
-            if stroke_count >= n:
-                break
-        translation_index = len(self.translations) - translation_count
-        if translation_index:
-            self.tail = self.translations[translation_index - 1]
-        del self.translations[:translation_index]
+        """Reduce the history of translations to n.
+
+        The fewest newest translations with at least n strokes between them
+        are kept, and always at least one. Thanks to the running stroke count
+        this only costs as much as the number of translations dropped.
+
+        """
+        history = self._translations
+        while (len(history) > 1 and 
+               history.stroke_count - len(history[0]) >= n):
+            self.tail = history.popleft()
+
+# In translate_strokes, the history is trimmed once it has this many more
+# strokes than it needs to.
+_TRIM_SLACK = 1000
+
+class TranslationStream(object):
+    """Translates a stream of strokes a part at a time.
+
+    This is what translate_strokes is made of. The stream can be started from
+    a given history of translations and stopped at any point, so a long stream
+    can be translated in pieces. Attributes:
+
+    state -- The _State of the translation, as a Translator would have it
+    except that the history may be longer.
+
+    done -- The translations that are no longer undoable, in order.
+
+    """
+
+    def __init__(self, dictionary, undo_length=0, format=None):
+        """Start a stream.
+
+        The arguments are as for translate_strokes.
+
+        """
+        self.state = _State()
+        self.done = []
+        self.dictionary = dictionary
+        self.size = max(dictionary.longest_key, undo_length)
+        self.format = format
+        if format:
+            self._callback = self._clear_formatting
+        else:
+            self._callback = lambda undo, do, prev: None
+
+    @staticmethod
+    def _clear_formatting(undo, do, prev):
+        # Translations done again are formatted again, as by a listener.
+        for t in do:
+            t.formatting = None
+
+    def translate(self, strokes):
+        """Translate strokes, continuing from where the stream is."""
+        state = self.state
+        dictionary = self.dictionary
+        callback = self._callback
+        history = state.translations
+        limit = self.size + _TRIM_SLACK
+        for stroke in strokes:
+            # Only a correction can reach further back than size strokes, so
+            # the history only has to be trimmed exactly before one.
+            if stroke.is_correction:
+                self.trim()
+            elif history.stroke_count > limit:
+                self._trim()
+            _translate_stroke(stroke, state, dictionary, callback)
+
+    def trim(self):
+        """Move everything that is no longer undoable to done.
+
+        The history is then the same as a Translator's and, if the stream
+        formats, every translation so far is formatted.
+
+        """
+        self._trim()
+        if self.format:
+            self._format_pending()
+
+    def finish(self):
+        """Format what is left and return all the translations."""
+        if self.format:
+            self._format_pending()
+        self.done.extend(self.state.translations)
+        del self.state.translations[:]
+        return self.done
+
+    def _trim(self):
+        # Like restrict_size but the translations dropped are kept.
+        history = self.state.translations
+        done = self.done
+        while (len(history) > 1 and 
+               history.stroke_count - len(history[0]) >= self.size):
+            done.append(history.popleft())
+
+    def _format_pending(self):
+        # Translations are only ever added at the end so the unformatted ones
+        # are the last ones.
+        format = self.format
+        translations = self.state.translations
+        done = self.done
+        i = len(translations)
+        while i and translations[i - 1].formatting is None:
+            i -= 1
+        if i:
+            format(translations[i:], translations[i - 1])
+            return
+        j = len(done)
+        while j and done[j - 1].formatting is None:
+            j -= 1
+        format(done[j:], done[j - 1] if j else None)
+        format(translations, done[-1] if done else None)
+
+def translate_strokes(strokes, dictionary, undo_length=0, format=None):
+    """Translate a whole stream of strokes.
+
+    Returns the translations a Translator with the same dictionary and
+    minimum undo length would have output by the end, less the ones that were
+    undone, without calling any listeners.
+
+    Arguments:
+
+    strokes -- An iterable of Stroke objects.
+
+    dictionary -- The steno dictionary.
+
+    undo_length -- The minimum undo length of the Translator.
+
+    format -- A function like formatting.apply_formatting, taking translations
+    and the one before them, or None. How far back a correction goes depends on
+    the formatting of the translations it undoes, so if the translations are
+    to be formatted this is called before each correction and at the end, and
+    every translation returned is formatted.
+
+    """
+    stream = TranslationStream(dictionary, undo_length, format)
+    stream.translate(strokes)
+    return stream.finish()
 
 def has_undo(t):
     # If there is no formatting then we're not dealing with a formatter so all 
@@ -246,12 +504,13 @@ def _translate_stroke(stroke, state, dictionary, callback):
 
     """
     
+    history = state.translations
     undo = []
     do = []
     
     # TODO: Test the behavior of undoing until a translation is undoable.
     if stroke.is_correction:
-        for t in reversed(state.translations):
+        for t in reversed(history):
             undo.append(t)
             if has_undo(t):
                 break
@@ -262,68 +521,115 @@ def _translate_stroke(stroke, state, dictionary, callback):
         # Figure out how much of the translation buffer can be involved in this
         # stroke and build the stroke list for translation.
         num_strokes = 1
-        translation_count = 0
-        for t in reversed(state.translations):
+        translations = []
+        for t in reversed(history):
             num_strokes += len(t)
             if num_strokes > dictionary.longest_key:
                 break
-            translation_count += 1
-        translation_index = len(state.translations) - translation_count
-        translations = state.translations[translation_index:]
+            translations.append(t)
+        translations.reverse()
         t = _find_translation(translations, dictionary, stroke)
         do.append(t)
         undo.extend(t.replaced)
     
-    del state.translations[len(state.translations) - len(undo):]
+    for t in undo:
+        history.pop()
     callback(undo, do, state.last())
-    state.translations.extend(do)
+    history.extend(do)
 
 SUFFIX_KEYS = ['-S', '-G', '-Z', '-D']
 
 def _find_translation(translations, dictionary, stroke):
-    t = _find_translation_helper(translations, dictionary, stroke, [])
+    # The RTFCRE of the strokes the new stroke can combine with, and where
+    # each translation's strokes start in it. Every candidate key is a slice
+    # of this plus the new stroke.
+    rtfcre = []
+    starts = []
+    for t in translations:
+        starts.append(len(rtfcre))
+        rtfcre.extend(t.rtfcre)
+    rtfcre = tuple(rtfcre)
+    t = _find_translation_helper(translations, dictionary, stroke,
+                                 _lookup_plain, rtfcre, starts)
     if t:
         return t
-    mapping = _lookup([stroke], dictionary, [])
+    mapping = _lookup_plain((), stroke, dictionary)
     if mapping is not None:  # Could be the empty string.
         return Translation([stroke], mapping)
-    t = _find_translation_helper(translations, dictionary, stroke, SUFFIX_KEYS)
+    # Every key has been looked up as it is by now, so only folding a suffix
+    # key off the new stroke is left.
+    t = _find_translation_helper(translations, dictionary, stroke,
+                                 _lookup_folded, rtfcre, starts)
     if t:
         return t
-    return Translation([stroke], _lookup([stroke], dictionary, SUFFIX_KEYS))
+    return Translation([stroke], _lookup_folded((), stroke, dictionary))
 
-def _find_translation_helper(translations, dictionary, stroke, suffixes):
+def _find_translation_helper(translations, dictionary, stroke, lookup,
+                             rtfcre, starts):
     # The new stroke can either create a new translation or replace
     # existing translations by matching a longer entry in the
     # dictionary.
-    for i in xrange(len(translations)):
-        replaced = translations[i:]
-        strokes = list(itertools.chain(*[t.strokes for t in replaced]))
-        strokes.append(stroke)
-        mapping = _lookup(strokes, dictionary, suffixes)
+    for i, start in enumerate(starts):
+        prefix = rtfcre[start:]
+        # Skip candidates that no dictionary entry could start with.
+        if not dictionary.has_prefix(prefix):
+            continue
+        mapping = lookup(prefix, stroke, dictionary)
         if mapping != None:
+            replaced = translations[i:]
+            strokes = [s for t in replaced for s in t.strokes]
+            strokes.append(stroke)
             t = Translation(strokes, mapping)
             t.replaced = replaced
             return t
 
 def _lookup(strokes, dictionary, suffixes):
-    dict_key = tuple(s.rtfcre for s in strokes)
-    result = dictionary.lookup(dict_key)
+    prefix = tuple(s.rtfcre for s in strokes[:-1])
+    result = _lookup_plain(prefix, strokes[-1], dictionary)
     if result != None:
         return result
+    return _fold_suffix(prefix, strokes[-1], dictionary, suffixes)
+
+def _lookup_plain(prefix, stroke, dictionary):
+    """Look up the RTFCRE prefix followed by stroke."""
+    return dictionary.lookup(prefix + (stroke.rtfcre,))
+
+def _lookup_folded(prefix, stroke, dictionary):
+    """Look up the RTFCRE prefix followed by stroke less a suffix key."""
+    return _fold_suffix(prefix, stroke, dictionary, SUFFIX_KEYS)
+
+def _fold_suffix(prefix, stroke, dictionary, suffixes):
+    # The first of suffixes in the stroke whose entry and the entry for the
+    # rest of the key both exist gives the translation.
+    for key, suffix, rest in _suffix_folds(stroke):
+        if key not in suffixes:
+            continue
+        main_mapping = dictionary.lookup(prefix + rest)
+        if main_mapping == None: continue
+        suffix_mapping = dictionary.lookup(suffix)
+        if suffix_mapping == None: continue
+        return main_mapping + ' ' + suffix_mapping
+    return None
 
-    for key in suffixes:
-        if key in strokes[-1].steno_keys:
-            dict_key = (Stroke([key]).rtfcre,)
-            suffix_mapping = dictionary.lookup(dict_key)
-            if suffix_mapping == None: continue
-            keys = strokes[-1].steno_keys[:]
-            keys.remove(key)
-            copy = strokes[:]
-            copy[-1] = Stroke(keys)
-            dict_key = tuple(s.rtfcre for s in copy)
-            main_mapping = dictionary.lookup(dict_key)
-            if main_mapping == None: continue
-            return main_mapping + ' ' + suffix_mapping
+# Maps a stroke to what _suffix_folds returns for it.
+_suffix_folds_by_stroke = {}
 
-    return None
+def _suffix_folds(stroke):
+    """The ways a suffix key can be folded off stroke.
+
+    Returns a tuple of the suffix key, the key of its entry and the stroke
+    without it as a key, in the order of SUFFIX_KEYS. Strokes are interned, so
+    this is only worked out once for each chord.
+
+    """
+    folds = _suffix_folds_by_stroke.get(stroke)
+    if folds is None:
+        folds = []
+        for key in SUFFIX_KEYS:
+            if key in stroke.steno_keys:
+                keys = list(stroke.steno_keys)
+                keys.remove(key)
+                folds.append((key, (Stroke([key]).rtfcre,), 
+                              (Stroke(keys).rtfcre,)))
+        folds = _suffix_folds_by_stroke.setdefault(stroke, tuple(folds))
+    return folds